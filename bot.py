@@ -1,13 +1,31 @@
 import requests
 import json
+import bisect
+import html
+import hashlib
+import sqlite3
 import asyncio
 import os
+import contextvars
+import logging.handlers
+import queue
+import itertools
+import secrets
+import threading
+import multiprocessing
+from collections import deque
+from contextlib import asynccontextmanager, closing, contextmanager
+from html.parser import HTMLParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes, ConversationHandler, CallbackQueryHandler
-import subprocess
+from telegram.error import BadRequest, RetryAfter
+from telegram.ext import Application, BaseUpdateProcessor, CommandHandler, MessageHandler, filters, ContextTypes, ConversationHandler, CallbackQueryHandler
+import signal
+import shutil
 from dotenv import load_dotenv
 import re
 from datetime import datetime
+import time
 import base64
 from io import BytesIO
 from PIL import Image
@@ -23,6 +41,46 @@ GITHUB_PAT = os.getenv("GITHUB_PAT")
 NETLIFY_API_TOKEN = os.getenv("NETLIFY_API_TOKEN")
 NETLIFY_SITE_ID = os.getenv("NETLIFY_SITE_ID")
 REPO_DIR = os.getenv("REPO_DIR", "landing_pages_repo")
+GITHUB_BASE_BRANCH = os.getenv("GITHUB_BASE_BRANCH")
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+ARTIFACT_DIR = os.getenv("ARTIFACT_DIR", "artifacts")
+PREVIEW_PORT = int(os.getenv("PREVIEW_PORT", "0"))
+PREVIEW_HOST = os.getenv("PREVIEW_HOST", "0.0.0.0")
+# Public address of the preview server; required, as Telegram buttons can't link to localhost
+PREVIEW_BASE_URL = os.getenv("PREVIEW_BASE_URL", "")
+PREVIEW_TTL = int(os.getenv("PREVIEW_TTL", "3600"))
+PUSH_BATCH_WINDOW = int(os.getenv("PUSH_BATCH_WINDOW_MS", "500")) / 1000
+PUSH_BATCH_MAX = int(os.getenv("PUSH_BATCH_MAX", "8"))
+GIT_FETCH_INTERVAL = int(os.getenv("GIT_FETCH_INTERVAL", "60"))
+REPO_MAX_STALENESS = int(os.getenv("REPO_MAX_STALENESS", "300"))
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+TRACE_MAX_BYTES = int(os.getenv("TRACE_MAX_BYTES", str(10 * 1024 * 1024)))
+TRACE_BACKUP_COUNT = int(os.getenv("TRACE_BACKUP_COUNT", "3"))
+OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT")
+OTLP_SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "landing-page-bot")
+TELEGRAM_GLOBAL_RATE = int(os.getenv("TELEGRAM_GLOBAL_RATE", "25"))
+TELEGRAM_CHAT_INTERVAL = float(os.getenv("TELEGRAM_CHAT_INTERVAL", "1.0"))
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", "0"))
+WORKER_POLL_INTERVAL = float(os.getenv("WORKER_POLL_INTERVAL", "0.5"))
+JOB_QUEUE_DB = os.getenv("JOB_QUEUE_DB", "jobs.db")
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "120"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+PUBLISH_PREP_TTL = int(os.getenv("PUBLISH_PREP_TTL", "1800"))
+# Versions generated in one Gemini call when the user asks for alternatives; below 2 turns the option off.
+# Gemini returns at most 8 candidates per call.
+PAGE_VARIANTS = min(int(os.getenv("PAGE_VARIANTS", "3")), 8)
+NETLIFY_SITE_CHECK_INTERVAL = int(os.getenv("NETLIFY_SITE_CHECK_INTERVAL", "300"))
+GEMINI_TIMEOUT = int(os.getenv("GEMINI_TIMEOUT", "120"))
+GIT_TIMEOUT = int(os.getenv("GIT_TIMEOUT", "120"))
+GIT_MAX_CONCURRENCY = int(os.getenv("GIT_MAX_CONCURRENCY", "4"))
+NETLIFY_TIMEOUT = int(os.getenv("NETLIFY_TIMEOUT", "30"))
+BREAKER_FAILURE_RATE = float(os.getenv("BREAKER_FAILURE_RATE", "0.5"))
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "20"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "5"))
+BREAKER_OPEN_SECONDS = int(os.getenv("BREAKER_OPEN_SECONDS", "60"))
+DEGRADED_MAX_WAIT = int(os.getenv("DEGRADED_MAX_WAIT", "3600"))
+MAX_CONCURRENT_UPDATES = int(os.getenv("MAX_CONCURRENT_UPDATES", "32"))
+ADMIN_IDS = {int(user_id) for user_id in os.getenv("ADMIN_IDS", "").split(",") if user_id.strip()}
 
 # Validate required environment variables
 if not all([TELEGRAM_BOT_TOKEN, GEMINI_API_KEY, GITHUB_REPO_URL, GITHUB_PAT]):
@@ -40,9 +98,13 @@ CALLBACK_HELP = "help"
 CALLBACK_CANCEL = "cancel"
 CALLBACK_FOOTER_YES = "footer_yes"
 CALLBACK_FOOTER_NO = "footer_no"
+CALLBACK_REDEPLOY = "redeploy_"
+CALLBACK_VARIANTS = "variants_"
 
 # --- Gemini API Endpoint and Model ---
-GEMINI_API_URL = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash-preview-05-20:generateContent?key={GEMINI_API_KEY}"
+GEMINI_MODEL = "gemini-2.5-flash-preview-05-20"
+GEMINI_API_BASE = "https://generativelanguage.googleapis.com/v1beta"
+GEMINI_API_URL = f"{GEMINI_API_BASE}/models/{GEMINI_MODEL}:generateContent?key={GEMINI_API_KEY}"
 
 # --- Landing page types ---
 LANDING_PAGE_TYPES = {
@@ -59,9 +121,10 @@ LANDING_PAGE_TYPES = {
 }
 
 # --- System prompts for different page types ---
-def get_system_prompt(page_type, channel_name, footer_text=None):
-    base_prompt = f"""
-You are a web page generator. Your task is to generate a complete, single-file HTML landing page for a channel called "{channel_name}".
+def get_system_prompt(page_type):
+    """The instructions shared by every page of a type; nothing user-specific goes here."""
+    base_prompt = """
+You are a web page generator. Your task is to generate a complete, single-file HTML landing page for the channel named in the request.
 The page must be fully responsive and styled with Tailwind CSS.
 It must follow this specific structure:
 1. A centered header with a logo (logo.png), title, and tagline.
@@ -72,9 +135,6 @@ The page should have a dark background and use vibrant, contrasting colors. The
 Do NOT include any external JavaScript or CSS files, put all code in a single file.
 """
     
-    if footer_text:
-        base_prompt += f"\nThe footer should include: 'Ads by {footer_text}'"
-    
     # Add specific instructions based on page type
     type_instructions = {
         "1": "Focus on modern tech aesthetics, innovation, and cutting-edge design. Use tech-related colors like blues, purples, and cyans.",
@@ -95,59 +155,1030 @@ Do NOT include any external JavaScript or CSS files, put all code in a single fi
     base_prompt += "\nRespond with ONLY the raw HTML code, no extra text or markdown."
     return base_prompt
 
+def get_page_prompt(page_type, channel_name, footer_text=None):
+    """The request for one page: what changes from user to user."""
+    prompt = f"Create a {LANDING_PAGE_TYPES.get(page_type, 'landing page')} for the channel called \"{channel_name}\"."
+    
+    if footer_text == FOOTER_PLACEHOLDER:
+        # Speculative generation: the footer answer is filled in once the user gives it
+        prompt += f"\nThe footer must include exactly this element: <span data-footer-credit>Ads by {FOOTER_PLACEHOLDER}</span>"
+    elif footer_text:
+        prompt += f"\nThe footer should include: 'Ads by {footer_text}'"
+    
+    return prompt
+
+# --- Tracing ---
+# Name of the root span opened for every landing page job
+JOB_SPAN_NAME = "landing_page.job"
+
+# The span that new spans are parented to; copied into tasks and threads automatically
+CURRENT_SPAN = contextvars.ContextVar("current_span", default=None)
+
+class Span:
+    """A timed operation inside a trace, with free-form attributes."""
+
+    def __init__(self, name, parent=None, attributes=None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = dict(attributes or {})
+        self.status = "ok"
+        self.start = time.time()
+        self.duration_ms = None
+        self._started = time.perf_counter()
+
+    def set(self, key, value):
+        """Records an attribute on the span."""
+        self.attributes[key] = value
+
+    def end(self):
+        self.duration_ms = round((time.perf_counter() - self._started) * 1000, 2)
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+class TraceExporter:
+    """Exports finished spans from a background thread.
+
+    Spans go to a rotating JSONL file, or to an OTLP/HTTP collector when
+    OTEL_EXPORTER_OTLP_ENDPOINT is set. Exporting never blocks the caller:
+    if the queue is full, spans are dropped.
+    """
+
+    def __init__(self, path=TRACE_FILE, otlp_endpoint=OTLP_ENDPOINT):
+        self.path = path
+        self.otlp_endpoint = otlp_endpoint
+        self._queue = queue.Queue(maxsize=10000)
+        self._thread = None
+        self._file_handler = None
+
+    def export(self, span):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+            self._thread.start()
+        try:
+            self._queue.put_nowait(span.to_dict())
+        except queue.Full:
+            pass
+
+    def close(self, timeout=5):
+        """Flushes the queued spans and stops the exporter thread."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            # Drain whatever else is ready so spans are written in batches
+            while len(batch) < 256:
+                try:
+                    batch.append(self._queue.get(timeout=0.5))
+                except queue.Empty:
+                    break
+            
+            stop = None in batch
+            batch = [record for record in batch if record is not None]
+            try:
+                if batch:
+                    if self.otlp_endpoint:
+                        self._send_otlp(batch)
+                    else:
+                        self._write_jsonl(batch)
+            except Exception as e:
+                print(f"Error exporting spans: {e}")
+            if stop:
+                return
+
+    def _write_jsonl(self, batch):
+        if self._file_handler is None:
+            self._file_handler = logging.handlers.RotatingFileHandler(
+                self.path, maxBytes=TRACE_MAX_BYTES, backupCount=TRACE_BACKUP_COUNT, encoding="utf-8"
+            )
+        for record in batch:
+            self._file_handler.emit(logging.makeLogRecord({"msg": json.dumps(record)}))
+
+    def _send_otlp(self, batch):
+        def otlp_value(value):
+            if isinstance(value, bool):
+                return {"boolValue": value}
+            if isinstance(value, int):
+                return {"intValue": str(value)}
+            if isinstance(value, float):
+                return {"doubleValue": value}
+            return {"stringValue": str(value)}
+        
+        spans = []
+        for record in batch:
+            start_ns = int(record["start"] * 1e9)
+            spans.append({
+                "traceId": record["trace_id"],
+                "spanId": record["span_id"],
+                "parentSpanId": record["parent_id"] or "",
+                "name": record["name"],
+                "kind": 1,
+                "startTimeUnixNano": str(start_ns),
+                "endTimeUnixNano": str(start_ns + int(record["duration_ms"] * 1e6)),
+                "attributes": [{"key": k, "value": otlp_value(v)} for k, v in record["attributes"].items()],
+                "status": {"code": 2 if record["status"] == "error" else 1},
+            })
+        payload = {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": OTLP_SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": "bot"}, "spans": spans}],
+        }]}
+        response = requests.post(f"{self.otlp_endpoint.rstrip('/')}/v1/traces", json=payload, timeout=10)
+        response.raise_for_status()
+
+TRACE_EXPORTER = TraceExporter()
+
+@contextmanager
+def span(name, **attributes):
+    """Times the enclosed block as a span of the current trace, starting a new trace if needed."""
+    current = Span(name, parent=CURRENT_SPAN.get(), attributes=attributes)
+    token = CURRENT_SPAN.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.status = "error"
+        current.set("error", f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        CURRENT_SPAN.reset(token)
+        current.end()
+        TRACE_EXPORTER.export(current)
+        METRICS.observe(current.name, current.duration_ms)
+
+# --- Metrics ---
+# Upper bounds of the latency buckets in ms: 20% apart, from 1ms to about 30 minutes
+LATENCY_BUCKETS = [1.2 ** index for index in range(80)]
+
+def latency_bucket(duration_ms):
+    return min(bisect.bisect_left(LATENCY_BUCKETS, duration_ms), len(LATENCY_BUCKETS) - 1)
+
+def percentile(bucket_counts, fraction):
+    """Estimates a percentile (as a bucket upper bound, in ms) from {bucket: count}."""
+    total = sum(bucket_counts.values())
+    seen = 0
+    for bucket in sorted(bucket_counts, key=int):
+        seen += bucket_counts[bucket]
+        if seen >= fraction * total:
+            return LATENCY_BUCKETS[int(bucket)]
+    return None
+
+class MinuteRing:
+    """Counts per key for each of the last 60 minutes, in a fixed number of slots."""
+
+    SLOTS = 60
+
+    def __init__(self):
+        self.slots = [[None, {}] for _ in range(self.SLOTS)]
+
+    def add(self, key, count=1, minute=None):
+        minute = int(time.time() // 60) if minute is None else minute
+        slot = self.slots[minute % self.SLOTS]
+        if slot[0] is None or slot[0] < minute:
+            slot[0], slot[1] = minute, {}
+        elif slot[0] > minute:
+            return  # Older than the window
+        slot[1][key] = slot[1].get(key, 0) + count
+
+    def totals(self, minutes=60):
+        """Counts per key over the last `minutes` minutes."""
+        current = int(time.time() // 60)
+        totals = {}
+        for minute, counts in self.slots:
+            if minute is not None and current - minutes < minute <= current:
+                for key, count in counts.items():
+                    totals[key] = totals.get(key, 0) + count
+        return totals
+
+    def export(self):
+        return [[minute, dict(counts)] for minute, counts in self.slots if minute is not None]
+
+    def merge(self, exported):
+        for minute, counts in exported:
+            for key, count in counts.items():
+                self.add(key, count, minute)
+
+class Metrics:
+    """Stage latencies and event counters for the last hour, kept in memory.
+
+    Recording is a dict increment, so it's cheap enough for every span.
+    Exports from several processes can be merged for a combined view.
+    """
+
+    def __init__(self):
+        self.latencies = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage, duration_ms):
+        """Records the duration of a pipeline stage."""
+        with self._lock:
+            self.latencies.setdefault(stage, MinuteRing()).add(str(latency_bucket(duration_ms)))
+
+    def count(self, name, key, count=1):
+        """Counts an event, e.g. count("cache.speculation", "hit")."""
+        with self._lock:
+            self.counters.setdefault(name, MinuteRing()).add(key, count)
+
+    def export(self):
+        with self._lock:
+            return {
+                'latencies': {name: ring.export() for name, ring in self.latencies.items()},
+                'counters': {name: ring.export() for name, ring in self.counters.items()},
+            }
+
+    def merge(self, exported):
+        with self._lock:
+            for name, ring in exported['latencies'].items():
+                self.latencies.setdefault(name, MinuteRing()).merge(ring)
+            for name, ring in exported['counters'].items():
+                self.counters.setdefault(name, MinuteRing()).merge(ring)
+
+    def cache_hit(self, cache, hit):
+        self.count(f"cache.{cache}", "hit" if hit else "miss")
+
+METRICS = Metrics()
+
+# --- Circuit breakers ---
+class UpstreamUnavailable(Exception):
+    """Raised instead of calling an upstream whose circuit breaker is open."""
+
+    def __init__(self, label, retry_after):
+        super().__init__(f"{label} is degraded")
+        self.label = label
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    """Stops calls to an upstream once too many of its recent calls failed.
+
+    After `open_seconds` the breaker is half-open: one probe call is let through
+    per interval, and its outcome closes the breaker or opens it again.
+    """
+
+    def __init__(self, name, label, failure_rate=BREAKER_FAILURE_RATE, window=BREAKER_WINDOW,
+                 min_calls=BREAKER_MIN_CALLS, open_seconds=BREAKER_OPEN_SECONDS):
+        self.name = name
+        self.label = label
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.state = "closed"
+        self.results = deque(maxlen=window)
+        self.opened_at = None
+        self.last_probe = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Whether a call may go ahead now; in the half-open state this uses up the probe."""
+        with self._lock:
+            if self.state == "closed":
+                return True
+            now = time.monotonic()
+            if self.state == "open":
+                if now - self.opened_at < self.open_seconds:
+                    return False
+                self.state = "half_open"
+                self.last_probe = None
+            if self.last_probe is None or now - self.last_probe >= self.open_seconds:
+                self.last_probe = now
+                return True
+            return False
+
+    def check(self):
+        if not self.allow():
+            raise UpstreamUnavailable(self.label, self.retry_after())
+
+    def record(self, ok):
+        """Records the outcome of a call."""
+        with self._lock:
+            if self.state == "half_open":
+                if ok:
+                    self._close()
+                else:
+                    self._open()
+            elif self.state == "closed":
+                self.results.append(ok)
+                failures = self.results.count(False)
+                if len(self.results) >= self.min_calls and failures / len(self.results) >= self.failure_rate:
+                    self._open()
+
+    def _open(self):
+        print(f"Circuit breaker for {self.label} opened, pausing calls for {self.open_seconds}s.")
+        self.state = "open"
+        self.opened_at = time.monotonic()
+        self.results.clear()
+
+    def _close(self):
+        print(f"Circuit breaker for {self.label} closed, {self.label} has recovered.")
+        self.state = "closed"
+        self.results.clear()
+
+    def retry_after(self):
+        """Seconds until the next call is let through."""
+        with self._lock:
+            if self.state == "closed":
+                return 0
+            since = self.opened_at if self.state == "open" else self.last_probe
+            if since is None:
+                return 0
+            return max(0, self.open_seconds - (time.monotonic() - since))
+
+    def snapshot(self):
+        retry_after = self.retry_after()
+        with self._lock:
+            return {
+                'name': self.name,
+                'label': self.label,
+                'state': self.state,
+                'calls': len(self.results),
+                'failures': self.results.count(False),
+                'retry_after': retry_after,
+            }
+
+BREAKERS = {
+    "gemini": CircuitBreaker("gemini", "Gemini"),
+    "github": CircuitBreaker("github", "GitHub"),
+    "netlify": CircuitBreaker("netlify", "Netlify"),
+}
+
+def upstream_failed(status_code):
+    """Whether an HTTP status means the upstream itself is in trouble, rather than the request."""
+    return status_code >= 500 or status_code == 429
+
 # --- Function to call the Gemini API ---
-async def generate_page_html(page_type, channel_name, footer_text=None):
-    """Sends a request to the Gemini API to generate the HTML for a landing page."""
+# Shared by Gemini and Netlify calls so connections are reused instead of re-negotiated
+HTTP_SESSION = requests.Session()
+
+# Token counts of the Gemini calls made by the current job, see track_token_usage
+TOKEN_USAGE = contextvars.ContextVar("token_usage", default=None)
+
+@asynccontextmanager
+async def track_token_usage(user_id, page_type, kind):
+    """Adds up the tokens of the Gemini calls made inside the block and records them for the user and page type."""
+    usage = {'calls': 0, 'prompt_tokens': 0, 'cached_tokens': 0, 'output_tokens': 0}
+    token = TOKEN_USAGE.set(usage)
+    try:
+        yield usage
+    finally:
+        TOKEN_USAGE.reset(token)
+        if usage['calls']:
+            current = CURRENT_SPAN.get()
+            if current:
+                for key, value in usage.items():
+                    current.set(f"gemini.{key}", value)
+            await asyncio.to_thread(ARTIFACTS.record_token_usage, user_id, page_type, kind, usage)
+
+def count_tokens(result, s):
+    """Records a response's usageMetadata on span `s`, the current job and the metrics."""
+    metadata = result.get("usageMetadata", {})
+    counts = {
+        'prompt_tokens': metadata.get("promptTokenCount", 0),
+        'cached_tokens': metadata.get("cachedContentTokenCount", 0),
+        # Thinking tokens are billed as output
+        'output_tokens': metadata.get("candidatesTokenCount", 0) + metadata.get("thoughtsTokenCount", 0),
+    }
+    usage = TOKEN_USAGE.get()
+    if usage is not None:
+        usage['calls'] += 1
+    for key, value in counts.items():
+        s.set(f"gemini.{key}", value)
+        METRICS.count("gemini.tokens", key, value)
+        if usage is not None:
+            usage[key] += value
+
+async def call_gemini(payload, s):
+    """Posts a generateContent request, recording the HTTP outcome on span `s`."""
     headers = {
         'Content-Type': 'application/json'
     }
     
-    system_prompt = get_system_prompt(page_type, channel_name, footer_text)
-    user_prompt = f"Create a {LANDING_PAGE_TYPES.get(page_type, 'landing page')} for the channel '{channel_name}'"
+    breaker = BREAKERS["gemini"]
+    breaker.check()
+    METRICS.count("gemini", "calls")
+    try:
+        response = await asyncio.to_thread(
+            HTTP_SESSION.post, GEMINI_API_URL, headers=headers, data=json.dumps(payload), timeout=GEMINI_TIMEOUT
+        )
+    except requests.exceptions.RequestException:
+        METRICS.count("gemini", "errors")
+        breaker.record(False)
+        raise
+    breaker.record(not upstream_failed(response.status_code))
+    if response.status_code >= 400:
+        METRICS.count("gemini", "errors")
+    if response.status_code == 429:
+        METRICS.count("gemini", "rate_limited")
+    s.set("http.status_code", response.status_code)
+    s.set("response_bytes", len(response.content))
+    response.raise_for_status()  # This will raise an HTTPError if the response was an error
+    result = response.json()
+    count_tokens(result, s)
+    return result
+
+async def generate_page_html(page_type, channel_name, footer_text=None, feedback=None):
+    """Sends a request to the Gemini API to generate the HTML for a landing page.
+
+    `feedback` lists what was wrong with a previous attempt, for a targeted regeneration.
+    """
+    candidates = await generate_page_candidates(page_type, channel_name, footer_text, feedback)
+    return candidates[0] if candidates else None
+
+async def generate_page_candidates(page_type, channel_name, footer_text=None, feedback=None, candidate_count=1):
+    """Generates up to `candidate_count` versions of a page in a single Gemini call.
+
+    Returns the HTML of each candidate Gemini returned, or an empty list on error.
+    """
+    user_prompt = get_page_prompt(page_type, channel_name, footer_text)
+    if feedback:
+        user_prompt += (
+            f"\n\nYour previous page was rejected because of: {'; '.join(feedback)}. "
+            "Return the complete page again with these problems fixed."
+        )
     
     payload = {
-        "contents": [{"parts": [{"text": user_prompt}]}],
-        "systemInstruction": {"parts": [{"text": system_prompt}]}
+        "systemInstruction": {"parts": [{"text": get_system_prompt(page_type)}]},
+        "contents": [{"parts": [{"text": user_prompt}]}]
     }
-    
-    try:
-        response = requests.post(GEMINI_API_URL, headers=headers, data=json.dumps(payload))
-        response.raise_for_status()  # This will raise an HTTPError if the response was an error
-        
-        result = response.json()
-        generated_text = result['candidates'][0]['content']['parts'][0]['text']
-        
-        # Strip any extra markdown like ```html and ```
-        if generated_text.startswith("```html") and generated_text.endswith("```"):
-            generated_text = generated_text[7:-3].strip()
+    if candidate_count > 1:
+        payload["generationConfig"] = {"candidateCount": candidate_count}
+    
+    with span("gemini.generate_page_html", page_type=page_type, regeneration=bool(feedback),
+              candidate_count=candidate_count) as s:
+        try:
+            result = await call_gemini(payload, s)
+            candidates = []
+            for candidate in result.get('candidates', []):
+                # A candidate stopped by a safety filter comes back without content
+                parts = candidate.get('content', {}).get('parts')
+                if not parts:
+                    continue
+                generated_text = parts[0]['text'].strip()
+                
+                # Strip any extra markdown like ```html and ```
+                if generated_text.startswith("```html") and generated_text.endswith("```"):
+                    generated_text = generated_text[7:-3].strip()
+                candidates.append(generated_text)
             
-        return generated_text
+            s.set("candidates", len(candidates))
+            s.set("html_chars", sum(len(candidate) for candidate in candidates))
+            return candidates
+        
+        except (requests.exceptions.RequestException, ValueError, KeyError, IndexError) as e:
+            s.status = "error"
+            print(f"Error calling Gemini API: {e}")
+            return []
+
+# --- Page validation ---
+PAGE_MIN_BYTES = 1024
+PAGE_MAX_BYTES = 512 * 1024
+
+VOID_ELEMENTS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"
+}
+# Elements whose end tag HTML lets you leave out
+OPTIONAL_END_ELEMENTS = {
+    "html", "head", "body", "p", "li", "dt", "dd", "option", "optgroup", "tr", "td", "th", "thead", "tbody", "tfoot",
+    "colgroup", "rt", "rp"
+}
+
+class PageValidator(HTMLParser):
+    """Checks well-formedness and the structure `get_system_prompt` asks for, in one pass over the page."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.problems = []
+        self.open_tags = []
+        self.counts = {}
+        self.has_logo = False
+        self.closed_html = False
+        self.footer_links = 0
+        self.footer_text = []
+        self.scripts = []
+
+    def handle_starttag(self, tag, attrs):
+        self.handle_startendtag(tag, attrs)
+        if tag not in VOID_ELEMENTS:
+            self.open_tags.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.counts[tag] = self.counts.get(tag, 0) + 1
+        if tag == "img":
+            src = (dict(attrs).get("src") or "").strip()
+            src = src[2:] if src.startswith("./") else src.lstrip("/")
+            if src == "logo.png":
+                self.has_logo = True
+        if tag == "a" and "footer" in self.open_tags:
+            self.footer_links += 1
+
+    def handle_endtag(self, tag):
+        if tag in VOID_ELEMENTS:
+            return
+        if tag not in self.open_tags:
+            self.problems.append(f"a stray </{tag}> tag")
+            return
+        while self.open_tags:
+            open_tag = self.open_tags.pop()
+            if open_tag == tag:
+                break
+            if open_tag not in OPTIONAL_END_ELEMENTS:
+                self.problems.append(f"<{open_tag}> is not closed before </{tag}>")
+        if tag == "html":
+            self.closed_html = True
+
+    def handle_data(self, data):
+        if not self.open_tags:
+            if data.strip() and "text outside the <html> element" not in self.problems:
+                self.problems.append("text outside the <html> element")
+            return
+        if self.open_tags[-1] == "script":
+            self.scripts.append(data)
+        if "footer" in self.open_tags:
+            self.footer_text.append(data)
+
+    def close(self):
+        super().close()
+        for open_tag in self.open_tags:
+            if open_tag not in OPTIONAL_END_ELEMENTS:
+                self.problems.append(f"<{open_tag}> is never closed")
+
+    def missing_structure(self, footer_text=None):
+        """Lists the required parts of the page that weren't found."""
+        missing = []
+        if not self.closed_html:
+            missing.append("the </html> end tag (the page looks truncated)")
+        if not self.has_logo:
+            missing.append('the header logo <img src="logo.png">')
+        if not self.counts.get("h1"):
+            missing.append("a title (<h1>)")
+        if not self.counts.get("button") and not self.counts.get("a"):
+            missing.append("the call-to-action button")
+        if not any("setInterval" in script or "setTimeout" in script for script in self.scripts):
+            missing.append("the countdown timer script")
+        if self.counts.get("p", 0) < 2:
+            missing.append("the main content paragraphs")
+        if not self.counts.get("footer") or not self.footer_links:
+            missing.append("a footer with a credit link")
+        elif footer_text and f"Ads by {footer_text}" not in " ".join("".join(self.footer_text).split()):
+            missing.append(f"'Ads by {footer_text}' in the footer")
+        return [f"missing {part}" for part in missing]
+
+def validate_page_html(html_content, footer_text=None):
+    """Checks a generated page before anything is pushed or deployed.
+
+    Returns a list of problems, empty if the page looks complete.
+    """
+    size = len(html_content.encode("utf-8"))
+    if size > PAGE_MAX_BYTES:
+        return [f"the page is {size // 1024} KB, over the {PAGE_MAX_BYTES // 1024} KB limit"]
+    
+    problems = []
+    if size < PAGE_MIN_BYTES:
+        problems.append("the page is too short to be complete")
+    
+    validator = PageValidator()
+    validator.feed(html_content)
+    validator.close()
+    
+    problems += validator.problems[:5] + validator.missing_structure(footer_text)
+    return problems
+
+async def generate_valid_page_html(page_type, channel_name, footer_text=None, html_content=None):
+    """Returns a page that passes validation, regenerating once with the problems found.
+
+    `html_content` is an already generated page to check first. Returns None if
+    no valid page could be produced.
+    """
+    if html_content is None:
+        html_content = await generate_page_html(page_type, channel_name, footer_text)
+    if not html_content:
+        return None
+    
+    with span("landing_page.validate", html_chars=len(html_content)) as s:
+        problems = validate_page_html(html_content, footer_text)
+        s.set("problems", len(problems))
+    if not problems:
+        return html_content
     
-    except requests.exceptions.RequestException as e:
-        print(f"Error calling Gemini API: {e}")
+    print(f"Generated page failed validation: {'; '.join(problems)}")
+    html_content = await generate_page_html(page_type, channel_name, footer_text, feedback=problems)
+    if not html_content:
+        return None
+    
+    with span("landing_page.validate", html_chars=len(html_content), regeneration=True) as s:
+        problems = validate_page_html(html_content, footer_text)
+        s.set("problems", len(problems))
+        if problems:
+            s.status = "error"
+            print(f"Regenerated page failed validation too: {'; '.join(problems)}")
+            return None
+    return html_content
+
+# --- Page variants ---
+def page_summary(html_content):
+    """Sums a page up in one line for the version picker: its title and size."""
+    match = re.search(r"<h1[^>]*>(.*?)</h1>", html_content, re.IGNORECASE | re.DOTALL)
+    title = " ".join(html.unescape(re.sub(r"<[^>]+>", " ", match.group(1))).split()) if match else ""
+    if len(title) > 60:
+        title = title[:57] + "..."
+    return f"“{title or 'Untitled'}” ({len(html_content.encode('utf-8')) // 1024} KB)"
+
+def review_variant(html_content, footer_text=None):
+    """Validates a generated version and sums it up. Returns (problems, summary)."""
+    return validate_page_html(html_content, footer_text), page_summary(html_content)
+
+def variants_button(artifact_id, label="🎲 Other Versions"):
+    return [InlineKeyboardButton(label, callback_data=f"{CALLBACK_VARIANTS}{artifact_id}")]
+
+# --- Speculative generation ---
+# Stands in for the footer name in pages generated before the user has answered the footer prompt
+FOOTER_PLACEHOLDER = "__FOOTER_NAME__"
+FOOTER_CREDIT_PATTERN = re.compile(r"<span data-footer-credit[^>]*>.*?</span>", re.DOTALL)
+
+async def speculate_page_html(user_id, page_type, channel_name):
+    """Generates a page with a footer placeholder while the user is still answering the footer prompt."""
+    with span("landing_page.speculation", channel_name=channel_name, page_type=page_type):
+        async with track_token_usage(user_id, page_type, "speculation"):
+            return await generate_page_html(page_type, channel_name, FOOTER_PLACEHOLDER)
+
+def start_speculation(context, user_id):
+    """Starts generating the page as soon as the channel name and page type are known."""
+    cancel_speculation(context)
+    channel_name = context.user_data.get('channel_name')
+    page_type = context.user_data.get('page_type')
+    context.user_data['speculation'] = {
+        'channel_name': channel_name,
+        'page_type': page_type,
+        'task': asyncio.create_task(speculate_page_html(user_id, page_type, channel_name)),
+    }
+
+def cancel_speculation(context):
+    """Drops a speculative generation the user no longer needs."""
+    speculation = context.user_data.pop('speculation', None)
+    if speculation:
+        speculation['task'].cancel()
+
+def take_speculation(context):
+    """Hands over the speculative generation if it still matches the user's answers."""
+    speculation = context.user_data.pop('speculation', None)
+    if not speculation:
+        return None
+    if (speculation['channel_name'], speculation['page_type']) != (
+            context.user_data.get('channel_name'), context.user_data.get('page_type')):
+        speculation['task'].cancel()
+        return None
+    return speculation['task']
+
+def fill_footer_placeholder(html_content, footer_text):
+    """Puts the footer answer into a speculatively generated page. Returns None if it can't."""
+    if not html_content or FOOTER_PLACEHOLDER not in html_content:
         return None
+    
+    if footer_text:
+        return html_content.replace(FOOTER_PLACEHOLDER, html.escape(footer_text))
+    
+    html_content = FOOTER_CREDIT_PATTERN.sub("", html_content)
+    return None if FOOTER_PLACEHOLDER in html_content else html_content
+
+# --- Incremental page edits ---
+PATCH_SYSTEM_PROMPT = """
+You edit an existing single-file HTML landing page. You will get the current HTML and an instruction.
+Respond with the smallest set of edits that carries out the instruction, as JSON.
+Each edit replaces one exact snippet of the current HTML ("find") with new text ("replace").
+Every "find" must be copied character for character from the current HTML and must occur exactly once in it,
+so include just enough surrounding text to make it unique. Never return the whole document.
+"""
+
+PATCH_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "edits": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {
+                    "find": {"type": "STRING"},
+                    "replace": {"type": "STRING"}
+                },
+                "required": ["find", "replace"]
+            }
+        }
+    },
+    "required": ["edits"]
+}
+
+async def generate_page_patch(html_content, instruction):
+    """Asks Gemini for a compact list of find/replace edits instead of a whole new page."""
+    payload = {
+        "contents": [{"parts": [{"text": f"Instruction: {instruction}\n\nCurrent HTML:\n{html_content}"}]}],
+        "systemInstruction": {"parts": [{"text": PATCH_SYSTEM_PROMPT}]},
+        "generationConfig": {
+            "responseMimeType": "application/json",
+            "responseSchema": PATCH_SCHEMA
+        }
+    }
+    
+    with span("gemini.generate_page_patch", html_chars=len(html_content)) as s:
+        try:
+            result = await call_gemini(payload, s)
+            patch = json.loads(result['candidates'][0]['content']['parts'][0]['text'])
+            s.set("edits", len(patch.get("edits", [])))
+            return patch.get("edits", [])
+        
+        except (requests.exceptions.RequestException, ValueError, KeyError, IndexError) as e:
+            s.status = "error"
+            print(f"Error getting page patch from Gemini: {e}")
+            return None
+
+def apply_page_patch(html_content, edits):
+    """Applies find/replace edits to a page. Returns (new_html, error)."""
+    if not edits:
+        return None, "no edits were suggested"
+    
+    for edit in edits:
+        find, replace = edit.get("find", ""), edit.get("replace", "")
+        occurrences = html_content.count(find) if find else 0
+        if occurrences != 1:
+            return None, f"an edit matched {occurrences} places instead of exactly one"
+        html_content = html_content.replace(find, replace, 1)
+    
+    # A broken patch never reaches git
+    problems = validate_page_html(html_content)
+    if problems:
+        return None, f"the edited page would be broken ({problems[0]})"
+    
+    return html_content, None
 
 # --- Git Integration Functions ---
-def run_git_command(command, cwd=None):
-    """A helper function to run Git commands and handle errors."""
+# Monotonic time of the last successful fetch of the base branch
+REPO_STATE = {'last_fetch': None}
+
+# Serializes fetches, which share the object store and shallow file; unlike
+# REPO_LOCK it doesn't cover the working tree, so the background fetch can run
+# while jobs commit
+FETCH_LOCK = asyncio.Lock()
+
+# Set once the startup warm-up has finished, successfully or not
+REPO_READY = asyncio.Event()
+
+def redact(text):
+    """Hides the GitHub token in anything that may be logged or traced."""
+    return text.replace(GITHUB_PAT, "***") if GITHUB_PAT else text
+
+def git_span(command):
+    """Opens a span for a git command, recording its arguments without credentials."""
+    return span(f"git.{command[1]}", args=redact(" ".join(command[2:])))
+
+# Git commands that talk to GitHub, and so count towards its circuit breaker
+GIT_NETWORK_COMMANDS = {"clone", "fetch", "push", "ls-remote"}
+
+def record_git_result(command, returncode):
+    """Feeds the outcome of a network git command to the GitHub breaker.
+
+    Only timeouts (None) and fatal errors (128) count as failures; a rejected
+    push or a missing branch means GitHub answered.
+    """
+    if command[1] in GIT_NETWORK_COMMANDS:
+        BREAKERS["github"].record(returncode not in (None, 128))
+
+# Never let git wait on a credential prompt no one can answer
+GIT_ENV = {
+    **os.environ,
+    "GIT_TERMINAL_PROMPT": "0",
+    "GCM_INTERACTIVE": "never",
+    "GIT_SSH_COMMAND": os.getenv("GIT_SSH_COMMAND", "ssh -o BatchMode=yes"),
+}
+# Bounds the git processes running at once, across jobs, batches and worktrees
+GIT_SEMAPHORE = asyncio.Semaphore(GIT_MAX_CONCURRENCY)
+# Only the tail of a command's output is kept; it's read as it's produced so git never blocks on a full pipe
+GIT_OUTPUT_LIMIT = 64 * 1024
+
+class GitResult:
+    """The outcome of a git command. `exit_code` is None if it timed out."""
+
+    def __init__(self, command, exit_code, duration_ms, stdout="", stderr=""):
+        self.command = command
+        self.exit_code = exit_code
+        self.duration_ms = duration_ms
+        self.stdout = stdout
+        self.stderr = stderr
+
+    @property
+    def ok(self):
+        return self.exit_code == 0
+
+    @property
+    def timed_out(self):
+        return self.exit_code is None
+
+async def read_stream_tail(stream, limit=GIT_OUTPUT_LIMIT):
+    """Drains a process stream, keeping only its last `limit` bytes."""
+    tail = bytearray()
+    while chunk := await stream.read(65536):
+        tail += chunk
+        del tail[:-limit]
+    return tail.decode("utf-8", errors="replace")
+
+def kill_process_group(process):
+    """Kills a process and anything it spawned, such as ssh or a credential helper."""
+    if process.returncode is not None:
+        return
     try:
-        result = subprocess.run(command, check=True, text=True, capture_output=True, cwd=cwd)
-        print(f"Git command success: {result.stdout}")
-        return True
-    except subprocess.CalledProcessError as e:
-        print(f"Git command failed: {e.stderr}")
+        if hasattr(os, "killpg"):
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except ProcessLookupError:
+        pass
+
+async def run_git(command, cwd=None, timeout=GIT_TIMEOUT):
+    """Runs a git command without blocking the event loop. Returns a GitResult.
+
+    Waits for one of GIT_MAX_CONCURRENCY slots first. A command still running
+    after `timeout` seconds, or whose caller is cancelled, is killed along with
+    its process group. Raises UpstreamUnavailable instead of talking to GitHub
+    while its circuit breaker is open, so the job takes the retry-later path.
+    """
+    if command[1] in GIT_NETWORK_COMMANDS:
+        BREAKERS["github"].check()
+    
+    queued_at = time.monotonic()
+    async with GIT_SEMAPHORE:
+        METRICS.observe("git.queue_wait", (time.monotonic() - queued_at) * 1000)
+        with git_span(command) as s:
+            started = time.monotonic()
+            try:
+                process = await asyncio.create_subprocess_exec(
+                    *command, cwd=cwd, env=GIT_ENV, start_new_session=True,
+                    stdin=asyncio.subprocess.DEVNULL,
+                    stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+                )
+            except OSError as e:
+                s.status = "error"
+                print(f"Could not start git: {e}")
+                return GitResult(command, 127, 0, stderr=str(e))
+            
+            async def communicate():
+                output = await asyncio.gather(read_stream_tail(process.stdout), read_stream_tail(process.stderr))
+                await process.wait()
+                return output
+            
+            try:
+                stdout, stderr = await asyncio.wait_for(communicate(), timeout)
+                exit_code = process.returncode
+            except asyncio.TimeoutError:
+                kill_process_group(process)
+                await process.wait()
+                stdout, stderr, exit_code = "", "", None
+                print(f"Git command timed out after {timeout}s: {redact(' '.join(command))}")
+            finally:
+                # Also covers the caller being cancelled mid-command
+                kill_process_group(process)
+            
+            result = GitResult(
+                command, exit_code, (time.monotonic() - started) * 1000, redact(stdout), redact(stderr)
+            )
+            s.set("exit_code", exit_code)
+            if not result.ok:
+                s.status = "error"
+    
+    record_git_result(command, exit_code)
+    METRICS.count("git", "commands")
+    if result.timed_out:
+        METRICS.count("git", "timeouts")
+    elif not result.ok:
+        METRICS.count("git", "failures")
+    return result
+
+async def run_git_command(command, cwd=None):
+    """A helper function to run Git commands and handle errors."""
+    result = await run_git(command, cwd=cwd)
+    if result.ok:
+        print(f"Git command success: git {command[1]} ({format_ms(result.duration_ms)})")
+    elif not result.timed_out:
+        print(f"Git command failed: {result.stderr.strip()}")
+    return result.ok
+
+async def get_base_branch():
+    """Returns the branch new landing pages are created from."""
+    if GITHUB_BASE_BRANCH:
+        return GITHUB_BASE_BRANCH
+    # Fall back to the remote's default branch recorded at clone time
+    result = await run_git(["git", "symbolic-ref", "--short", "refs/remotes/origin/HEAD"], cwd=REPO_DIR)
+    if result.ok and result.stdout.strip():
+        return result.stdout.strip().split("/", 1)[-1]
+    return "main"
+
+async def clone_repo():
+    """Makes a shallow, blobless and sparse (root files only) clone of the repository.
+
+    Its cost does not grow with the history or size of the landing-pages repository.
+    """
+    print("Cloning repository...")
+    # Use PAT for authentication in the URL
+    authenticated_url = GITHUB_REPO_URL.replace("https://", f"https://oauth2:{GITHUB_PAT}@")
+    command = [
+        "git", "clone", "--depth", "1", "--filter=blob:none", "--sparse", "--single-branch"
+    ]
+    if GITHUB_BASE_BRANCH:
+        command += ["--branch", GITHUB_BASE_BRANCH]
+    if not await run_git_command(command + [authenticated_url, REPO_DIR]):
         return False
+    
+    REPO_STATE['last_fetch'] = time.monotonic()
+    return True
 
-def setup_git_repo():
-    """Clones the repository if it doesn't exist."""
-    if not os.path.exists(REPO_DIR):
-        print("Cloning repository...")
-        # Use PAT for authentication in the URL
-        authenticated_url = GITHUB_REPO_URL.replace("https://", f"https://oauth2:{GITHUB_PAT}@")
-        return run_git_command(["git", "clone", authenticated_url, REPO_DIR])
-    else:
-        print("Repository already exists. Pulling latest changes.")
-        return run_git_command(["git", "pull"], cwd=REPO_DIR)
+async def fetch_branch(branch_name):
+    """Fetches only the tip of a branch into origin/<branch>. Doesn't touch the working tree."""
+    refspec = f"+refs/heads/{branch_name}:refs/remotes/origin/{branch_name}"
+    async with FETCH_LOCK:
+        return await run_git_command(["git", "fetch", "--depth", "1", "origin", refspec], cwd=REPO_DIR)
+
+async def prefetch_root_blobs(revision):
+    """Downloads the root files of `revision` that the blobless clone doesn't have yet.
+
+    Reading an object's size is enough for git to fetch a missing blob; ones
+    already present are answered locally.
+    """
+    result = await run_git(["git", "ls-tree", revision], cwd=REPO_DIR)
+    if not result.ok:
+        return False
+    for line in result.stdout.splitlines():
+        # "<mode> <type> <object>\t<path>"
+        _, object_type, object_id = line.split("\t", 1)[0].split()
+        if object_type == "blob" and not (await run_git(["git", "cat-file", "-s", object_id], cwd=REPO_DIR)).ok:
+            return False
+    return True
+
+async def fetch_base_branch():
+    """Fetches only the tip of the base branch into origin/<base>, with the files jobs check out."""
+    base_branch = await get_base_branch()
+    if not await fetch_branch(base_branch):
+        return False
+    
+    REPO_STATE['last_fetch'] = time.monotonic()
+    # Otherwise the job's checkout would download the new files on the request path
+    async with FETCH_LOCK:
+        if not await prefetch_root_blobs(f"origin/{base_branch}"):
+            print(f"Could not prefetch the files of {base_branch}, the next checkout will download them.")
+    return True
+
+async def checkout_base_branch():
+    """Resets the working tree to the last fetched base branch.
+
+    `fetch_base_branch` has already downloaded its files, so this normally stays local.
+    """
+    base_branch = await get_base_branch()
+    return await run_git_command(
+        ["git", "checkout", "-f", "-B", base_branch, f"origin/{base_branch}"], cwd=REPO_DIR
+    )
+
+def repo_is_fresh():
+    """Whether the local clone was fetched recently enough to skip a fetch on the request path."""
+    last_fetch = REPO_STATE['last_fetch']
+    return last_fetch is not None and time.monotonic() - last_fetch <= REPO_MAX_STALENESS
+
+async def setup_git_repo():
+    """Clones the repository if it doesn't exist, otherwise syncs the base branch."""
+    if not os.path.exists(os.path.join(REPO_DIR, ".git")):
+        return await clone_repo()
+
+    print("Repository already exists. Fetching the base branch.")
+    if not await fetch_base_branch():
+        return False
+    return await checkout_base_branch()
+
+async def prepare_repo_for_job():
+    """Gets the working tree ready for a new page.
+
+    The clone is warmed at startup and kept fresh in the background, so this
+    normally only checks freshness and resets the tree locally.
+    """
+    fresh = os.path.exists(os.path.join(REPO_DIR, ".git")) and repo_is_fresh()
+    METRICS.cache_hit("repo", fresh)
+    if fresh:
+        return await checkout_base_branch()
+    
+    print("Repository is missing or stale, syncing on the request path.")
+    return await setup_git_repo()
+
+async def remote_branch_exists(branch_name):
+    """Checks for a branch on the remote with a single targeted ref lookup."""
+    command = ["git", "ls-remote", "--exit-code", "--heads", "origin", f"refs/heads/{branch_name}"]
+    result = await run_git(command, cwd=REPO_DIR)
+    return result.ok
 
 def sanitize_branch_name(name):
     """Sanitize a string to be a valid Git branch name."""
@@ -162,40 +1193,196 @@ def sanitize_branch_name(name):
         sanitized = f"page-{sanitized}"
     return sanitized
 
-def push_to_github(filename, branch_name, logo_path=None):
-    """Adds, commits, and pushes a file to GitHub on a new branch."""
+async def commit_page(filename, branch_name, logo_path=None, commit_message=None):
+    """Adds and commits a page on its branch locally. Returns the sanitized branch name."""
     # Sanitize the branch name
     branch_name = sanitize_branch_name(branch_name)
     
-    # Check if branch already exists
-    result = subprocess.run(["git", "branch", "-r"], cwd=REPO_DIR, capture_output=True, text=True)
-    if f"origin/{branch_name}" in result.stdout:
-        # Switch to existing branch
-        if not run_git_command(["git", "checkout", branch_name], cwd=REPO_DIR):
-            return False
-    else:
-        # Create and switch to a new branch
-        if not run_git_command(["git", "checkout", "-b", branch_name], cwd=REPO_DIR):
-            return False
+    # Create and switch to the branch, keeping the freshly written files
+    if not await run_git_command(["git", "checkout", "-B", branch_name], cwd=REPO_DIR):
+        return None
+    
+    # If the branch already exists, build on top of its tip (fetching only that ref)
+    if await remote_branch_exists(branch_name):
+        if not await fetch_branch(branch_name):
+            return None
+        if not await run_git_command(["git", "reset", "-q", f"origin/{branch_name}"], cwd=REPO_DIR):
+            return None
     
     # Add the new file
-    if not run_git_command(["git", "add", filename], cwd=REPO_DIR):
-        return False
+    if not await run_git_command(["git", "add", filename], cwd=REPO_DIR):
+        return None
     
     # Add logo if provided
     if logo_path and os.path.exists(logo_path):
-        if not run_git_command(["git", "add", "logo.png"], cwd=REPO_DIR):
-            return False
+        shutil.copyfile(logo_path, os.path.join(REPO_DIR, "logo.png"))
+        if not await run_git_command(["git", "add", "logo.png"], cwd=REPO_DIR):
+            return None
         
+    # Republishing an unchanged page leaves nothing to commit; the branch is pushed as-is
+    result = await run_git(["git", "diff", "--cached", "--quiet"], cwd=REPO_DIR)
+    if result.ok:
+        print(f"No changes for {branch_name}, skipping commit.")
+        return branch_name
+    
     # Commit the changes
-    commit_message = f"feat: add new landing page for {branch_name}"
-    if not run_git_command(["git", "commit", "-m", commit_message], cwd=REPO_DIR):
-        return False
+    commit_message = commit_message or f"feat: add new landing page for {branch_name}"
+    if not await run_git_command(["git", "commit", "-m", commit_message], cwd=REPO_DIR):
+        return None
+    
+    return branch_name
+
+async def push_branches(branch_names):
+    """Pushes several branches in a single `git push`.
+
+    Returns {branch: True if pushed, False if rejected, None if the push
+    never got an answer for it (a timeout or a transport failure)}.
+    """
+    refspecs = [f"refs/heads/{name}:refs/heads/{name}" for name in branch_names]
+    result = await run_git(["git", "push", "--porcelain", "origin", *refspecs], cwd=REPO_DIR)
+    statuses = {name: None for name in branch_names}
+    if result.timed_out:
+        return statuses
+    if not result.ok:
+        print(f"Git push failed: {result.stderr.strip()}")
+    
+    # Porcelain lines look like "<flag>\t<src>:<dst>\t<summary>"; "!" means rejected
+    for line in result.stdout.splitlines():
+        parts = line.split("\t")
+        if len(parts) < 2 or ":" not in parts[1]:
+            continue
+        ref = parts[1].split(":", 1)[1]
+        name = ref[len("refs/heads/"):] if ref.startswith("refs/heads/") else ref
+        if name in statuses:
+            statuses[name] = parts[0] != "!"
+    return statuses
+
+class PushBatcher:
+    """Group-commits pushes: branches committed within a short window share one `git push`."""
+
+    def __init__(self, window=PUSH_BATCH_WINDOW, max_batch=PUSH_BATCH_MAX):
+        self.window = window
+        self.max_batch = max_batch
+        self._pending = {}
+        self._timer = None
+
+    async def push(self, branch_name):
+        """Queues a branch for the next batch and waits for its own push result."""
+        future = asyncio.get_running_loop().create_future()
+        # The same branch twice in one window is pushed once, at its latest commit
+        self._pending.setdefault(branch_name, []).append(future)
         
-    # Push the new branch to the remote repository
-    if not run_git_command(["git", "push", "-u", "origin", branch_name], cwd=REPO_DIR):
-        return False
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+        
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, {}
+        if batch:
+            asyncio.create_task(self._push_batch(batch))
+
+    async def _push_batch(self, batch):
+        branch_names = list(batch)
+        print(f"Pushing {len(branch_names)} branch(es) in one batch: {', '.join(branch_names)}")
+        try:
+            statuses = await push_branches(branch_names)
+            
+            # Fall back to individual pushes only for refs GitHub rejected; if the
+            # push as a whole timed out or failed, retrying each ref would only wait longer
+            for name in branch_names:
+                if statuses[name] is False:
+                    statuses[name] = await run_git_command(["git", "push", "origin", name], cwd=REPO_DIR)
+        except UpstreamUnavailable as e:
+            # Hand the breaker's verdict to each job, so it's retried once GitHub recovers
+            for futures in batch.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+        except Exception as e:
+            print(f"Error pushing batch: {e}")
+            statuses = {name: False for name in branch_names}
+        
+        for name, futures in batch.items():
+            for future in futures:
+                if not future.done():
+                    future.set_result(bool(statuses[name]))
+
+# Serializes access to the shared working tree in REPO_DIR
+REPO_LOCK = asyncio.Lock()
+PUSH_BATCHER = PushBatcher()
+
+async def publish_page(html_content, branch_name, logo_path=None, commit_message=None, publish_prep=None):
+    """Writes and commits a page on its branch, then pushes it as part of a batch.
+
+    `publish_prep` is a task from `prepare_publish`; when its worktree is ready,
+    only index.html is left to add, commit and push.
+    Returns the sanitized branch name, or None if the page could not be pushed.
+    """
+    filename = "index.html"
+    await REPO_READY.wait()
+    
+    prep = await resolve_publish_prep(publish_prep)
+    if prep:
+        async with REPO_LOCK:
+            prepared_branch = await commit_prepared_page(prep, html_content, commit_message)
+        if prepared_branch and await PUSH_BATCHER.push(prepared_branch):
+            METRICS.cache_hit("publish_prep", True)
+            return prepared_branch
+        print("Prepared publish failed, publishing from the main working tree.")
+    if publish_prep is not None:
+        METRICS.cache_hit("publish_prep", False)
+    
+    async with REPO_LOCK:
+        if not await prepare_repo_for_job():
+            print("Could not set up the Git repository.")
+            return None
         
+        with open(os.path.join(REPO_DIR, filename), "w", encoding="utf-8") as file:
+            file.write(html_content)
+        
+        branch_name = await commit_page(filename, branch_name, logo_path, commit_message)
+    
+    if branch_name and await PUSH_BATCHER.push(branch_name):
+        return branch_name
+    return None
+
+# Monotonic time of the last successful Netlify site lookup
+NETLIFY_STATE = {'site_checked': None}
+
+def netlify_headers():
+    return {
+        'Authorization': f'Bearer {NETLIFY_API_TOKEN}',
+        'Content-Type': 'application/json'
+    }
+
+def netlify_site_is_known():
+    """Whether the Netlify site was looked up recently enough to skip the lookup."""
+    checked = NETLIFY_STATE['site_checked']
+    return checked is not None and time.monotonic() - checked <= NETLIFY_SITE_CHECK_INTERVAL
+
+def check_netlify_site(headers, s):
+    """Looks up the Netlify site, recording the outcome on span `s`. Returns whether it exists."""
+    try:
+        site_response = HTTP_SESSION.get(
+            f'https://api.netlify.com/api/v1/sites/{NETLIFY_SITE_ID}', headers=headers, timeout=NETLIFY_TIMEOUT
+        )
+    except requests.exceptions.RequestException:
+        BREAKERS["netlify"].record(False)
+        raise
+    BREAKERS["netlify"].record(not upstream_failed(site_response.status_code))
+    s.set("site.http.status_code", site_response.status_code)
+    if site_response.status_code != 200:
+        print(f"Error getting site info: {site_response.text}")
+        return False
+    
+    NETLIFY_STATE['site_checked'] = time.monotonic()
     return True
 
 def deploy_to_netlify(branch_name, channel_name):
@@ -211,41 +1398,808 @@ def deploy_to_netlify(branch_name, channel_name):
     # Create subdomain
     subdomain_url = f"{subdomain}.netlify.app"
     
-    try:
-        # Trigger Netlify build
-        headers = {
-            'Authorization': f'Bearer {NETLIFY_API_TOKEN}',
-            'Content-Type': 'application/json'
-        }
+    with span("netlify.deploy", branch=branch_name) as s:
+        # The page is already on GitHub; while Netlify is degraded, leave the deploy for a redeploy
+        if not BREAKERS["netlify"].allow():
+            s.status = "error"
+            s.set("breaker", "open")
+            print("Netlify circuit breaker is open, skipping deployment")
+            return None
         
-        # Get site info
-        site_response = requests.get(f'https://api.netlify.com/api/v1/sites/{NETLIFY_SITE_ID}', headers=headers)
-        if site_response.status_code != 200:
-            print(f"Error getting site info: {site_response.text}")
+        try:
+            # Trigger Netlify build
+            headers = netlify_headers()
+            
+            # Get site info, unless it was looked up recently (e.g. while the user was still answering)
+            site_known = netlify_site_is_known()
+            METRICS.cache_hit("netlify_site", site_known)
+            if not site_known and not check_netlify_site(headers, s):
+                s.status = "error"
+                return None
+            
+            # Create a new deploy
+            deploy_data = {
+                "branch": branch_name,
+                "title": f"Deploy {channel_name} landing page"
+            }
+            
+            try:
+                deploy_response = HTTP_SESSION.post(
+                    f'https://api.netlify.com/api/v1/sites/{NETLIFY_SITE_ID}/deploys',
+                    headers=headers,
+                    json=deploy_data,
+                    timeout=NETLIFY_TIMEOUT
+                )
+            except requests.exceptions.RequestException:
+                BREAKERS["netlify"].record(False)
+                raise
+            BREAKERS["netlify"].record(not upstream_failed(deploy_response.status_code))
+            s.set("http.status_code", deploy_response.status_code)
+            
+            if deploy_response.status_code == 201:
+                deploy_info = deploy_response.json()
+                return f"https://{subdomain_url}"
+            else:
+                s.status = "error"
+                print(f"Error creating deploy: {deploy_response.text}")
+                return None
+                
+        except Exception as e:
+            s.status = "error"
+            print(f"Error deploying to Netlify: {e}")
+            return None
+
+# --- Eager publish preparation ---
+def worktree_root():
+    # Absolute, since git resolves a relative worktree path against REPO_DIR rather than our cwd
+    return os.path.abspath(f"{REPO_DIR}-worktrees")
+
+async def prepare_worktree(branch_name, logo_path=None):
+    """Creates a detached worktree at the tip of the page's branch (or the base branch) with the logo staged.
+
+    The network round trips run without REPO_LOCK; it's only held to add the worktree and stage the logo.
+    """
+    branch_name = sanitize_branch_name(branch_name)
+    worktree = os.path.join(worktree_root(), secrets.token_hex(8))
+    
+    # Build on top of the branch if it already exists, fetching only that ref
+    start_point = f"origin/{await get_base_branch()}"
+    if await remote_branch_exists(branch_name):
+        if not await fetch_branch(branch_name):
+            return None
+        start_point = f"origin/{branch_name}"
+    
+    async with REPO_LOCK:
+        if not await run_git_command(["git", "worktree", "add", "--detach", worktree, start_point], cwd=REPO_DIR):
             return None
         
-        # Create a new deploy
-        deploy_data = {
-            "branch": branch_name,
-            "title": f"Deploy {channel_name} landing page"
-        }
+        prep = {'branch_name': branch_name, 'worktree': worktree}
+        if logo_path and os.path.exists(logo_path):
+            try:
+                shutil.copyfile(logo_path, os.path.join(worktree, "logo.png"))
+                staged = await run_git_command(["git", "add", "logo.png"], cwd=worktree)
+            except Exception as e:
+                print(f"Error staging logo in worktree: {e}")
+                staged = False
+            if not staged:
+                await remove_worktree(prep)
+                return None
+        return prep
+
+async def prune_worktrees():
+    """Drops worktrees left behind by a previous run."""
+    shutil.rmtree(worktree_root(), ignore_errors=True)
+    if os.path.exists(os.path.join(REPO_DIR, ".git")):
+        await run_git_command(["git", "worktree", "prune"], cwd=REPO_DIR)
+
+async def remove_worktree(prep):
+    """Removes a prepared worktree. Nothing else needs rolling back: no branch has been moved yet."""
+    if os.path.exists(prep['worktree']):
+        await run_git_command(["git", "worktree", "remove", "--force", prep['worktree']], cwd=REPO_DIR)
+
+async def commit_prepared_page(prep, html_content, commit_message=None):
+    """Adds index.html in a prepared worktree, commits it and points the page's branch at it."""
+    worktree = prep['worktree']
+    branch_name = prep['branch_name']
+    if not os.path.exists(worktree):
+        return None
+    
+    with open(os.path.join(worktree, "index.html"), "w", encoding="utf-8") as file:
+        file.write(html_content)
+    if not await run_git_command(["git", "add", "index.html"], cwd=worktree):
+        return None
+    
+    commit_message = commit_message or f"feat: add new landing page for {branch_name}"
+    if not await run_git_command(["git", "commit", "-m", commit_message], cwd=worktree):
+        return None
+    
+    # The worktree is detached, so the branch only moves once the commit exists
+    if not await run_git_command(["git", "update-ref", f"refs/heads/{branch_name}", "HEAD"], cwd=worktree):
+        return None
+    return branch_name
+
+def warm_netlify():
+    """Looks up the Netlify site ahead of the deploy, which also opens the connection."""
+    if not NETLIFY_API_TOKEN or not NETLIFY_SITE_ID or netlify_site_is_known():
+        return
+    if not BREAKERS["netlify"].allow():
+        return
+    with span("netlify.site_lookup") as s:
+        try:
+            if not check_netlify_site(netlify_headers(), s):
+                s.status = "error"
+        except requests.exceptions.RequestException as e:
+            s.status = "error"
+            print(f"Error looking up Netlify site: {e}")
+
+async def prepare_publish(channel_name, logo_path=None):
+    """Does the publishing work that doesn't depend on the page: branch, worktree, logo and connections.
+
+    Returns the prepared worktree, or None if it couldn't be prepared.
+    """
+    await REPO_READY.wait()
+    with span("landing_page.prepare_publish", channel_name=channel_name):
+        warm_up = asyncio.create_task(asyncio.to_thread(warm_netlify))
+        try:
+            return await prepare_worktree(f"page-{channel_name}", logo_path)
+        finally:
+            await warm_up
+
+async def resolve_publish_prep(publish_prep):
+    """Waits for a publish preparation task, returning its worktree or None."""
+    if publish_prep is None:
+        return None
+    try:
+        return await publish_prep
+    except Exception as e:
+        print(f"Publish preparation failed: {e}")
+        return None
+
+async def discard_publish_prep(publish_prep):
+    """Rolls back a publish preparation once it has finished."""
+    prep = await resolve_publish_prep(publish_prep)
+    if prep:
+        async with REPO_LOCK:
+            await remove_worktree(prep)
+
+def start_publish_prep(context):
+    """Starts preparing the publish as soon as the channel name and logo are known."""
+    abandon_publish_prep(context)
+    # Worker processes have their own clones, so there's nothing to prepare in this one
+    if WORKER_PROCESSES > 0 or not GITHUB_PAT:
+        return
+    
+    channel_name = context.user_data.get('channel_name')
+    prep = {
+        'channel_name': channel_name,
+        'task': asyncio.create_task(prepare_publish(channel_name, context.user_data.get('logo_path'))),
+    }
+    # Users who walk away don't keep a worktree around forever
+    prep['timer'] = asyncio.get_running_loop().call_later(
+        PUBLISH_PREP_TTL, expire_publish_prep, context.user_data, prep
+    )
+    context.user_data['publish_prep'] = prep
+
+def expire_publish_prep(user_data, prep):
+    if user_data.get('publish_prep') is prep:
+        user_data.pop('publish_prep')
+        asyncio.create_task(discard_publish_prep(prep['task']))
+
+def abandon_publish_prep(context):
+    """Rolls back a publish preparation the user no longer needs."""
+    prep = context.user_data.pop('publish_prep', None)
+    if prep:
+        prep['timer'].cancel()
+        asyncio.create_task(discard_publish_prep(prep['task']))
+
+def take_publish_prep(context):
+    """Hands over the publish preparation if it still matches the user's answers."""
+    prep = context.user_data.get('publish_prep')
+    if not prep:
+        return None
+    if prep['channel_name'] != context.user_data.get('channel_name'):
+        abandon_publish_prep(context)
+        return None
+    context.user_data.pop('publish_prep')
+    prep['timer'].cancel()
+    return prep['task']
+
+# --- Artifact store ---
+class ArtifactStore:
+    """Keeps every generated page and logo, with the inputs that produced it.
+
+    Contents are stored once per SHA-256 as blob files, and a SQLite index
+    maps artifacts (one per generated page) to their blobs.
+    """
+
+    def __init__(self, root=ARTIFACT_DIR):
+        self.root = root
+        self.db_path = os.path.join(root, "artifacts.db")
+        self._initialized = False
+
+    def _connect(self):
+        if not self._initialized:
+            os.makedirs(os.path.join(self.root, "blobs"), exist_ok=True)
+        connection = sqlite3.connect(self.db_path, timeout=30)
+        connection.row_factory = sqlite3.Row
+        if not self._initialized:
+            with connection:
+                connection.execute("""
+                    CREATE TABLE IF NOT EXISTS artifacts (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        user_id INTEGER,
+                        channel_name TEXT NOT NULL,
+                        page_type TEXT NOT NULL,
+                        footer_text TEXT,
+                        html_sha256 TEXT NOT NULL,
+                        logo_sha256 TEXT,
+                        branch_name TEXT,
+                        netlify_url TEXT,
+                        created_at TEXT NOT NULL,
+                        kind TEXT NOT NULL DEFAULT 'page'
+                    )
+                """)
+                # Stores created before versions were offered have no kind column
+                columns = {row['name'] for row in connection.execute("PRAGMA table_info(artifacts)")}
+                if "kind" not in columns:
+                    connection.execute("ALTER TABLE artifacts ADD COLUMN kind TEXT NOT NULL DEFAULT 'page'")
+                connection.execute(
+                    "CREATE INDEX IF NOT EXISTS artifacts_by_user ON artifacts (user_id, id)"
+                )
+                connection.execute("""
+                    CREATE TABLE IF NOT EXISTS token_usage (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        user_id INTEGER,
+                        page_type TEXT,
+                        kind TEXT NOT NULL,
+                        calls INTEGER NOT NULL,
+                        prompt_tokens INTEGER NOT NULL,
+                        cached_tokens INTEGER NOT NULL,
+                        output_tokens INTEGER NOT NULL,
+                        created_at REAL NOT NULL
+                    )
+                """)
+                connection.execute("""
+                    CREATE TABLE IF NOT EXISTS previews (
+                        token TEXT PRIMARY KEY,
+                        artifact_id INTEGER NOT NULL,
+                        expires_at REAL NOT NULL
+                    )
+                """)
+            self._initialized = True
+        return connection
+
+    def blob_path(self, digest):
+        return os.path.join(self.root, "blobs", digest[:2], digest[2:])
+
+    def put_blob(self, data):
+        """Stores bytes under their SHA-256 and returns the digest. Identical content is stored once."""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.blob_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.{secrets.token_hex(4)}.tmp"
+            with open(temp_path, "wb") as file:
+                file.write(data)
+            os.replace(temp_path, path)
+        return digest
+
+    def get_blob(self, digest):
+        with open(self.blob_path(digest), "rb") as file:
+            return file.read()
+
+    def record(self, user_id, channel_name, page_type, footer_text, html_content, logo_path=None, kind="page"):
+        """Stores a generated page (and its logo) and returns the new artifact ID.
+
+        `kind` is "variant" for a version offered in the picker; it stays out of
+        the user's history until it's picked and published.
+        """
+        html_sha256 = self.put_blob(html_content.encode("utf-8"))
+        logo_sha256 = None
+        if logo_path and os.path.exists(logo_path):
+            with open(logo_path, "rb") as file:
+                logo_sha256 = self.put_blob(file.read())
         
-        deploy_response = requests.post(
-            f'https://api.netlify.com/api/v1/sites/{NETLIFY_SITE_ID}/deploys',
-            headers=headers,
-            json=deploy_data
-        )
+        with closing(self._connect()) as connection, connection:
+            cursor = connection.execute(
+                "INSERT INTO artifacts (user_id, channel_name, page_type, footer_text, html_sha256, logo_sha256, "
+                "created_at, kind) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (user_id, channel_name, page_type, footer_text, html_sha256, logo_sha256,
+                 datetime.now().isoformat(timespec="seconds"), kind)
+            )
+            return cursor.lastrowid
+
+    def mark_published(self, artifact_id, branch_name, netlify_url=None):
+        with closing(self._connect()) as connection, connection:
+            connection.execute(
+                "UPDATE artifacts SET branch_name = ?, netlify_url = ? WHERE id = ?",
+                (branch_name, netlify_url, artifact_id)
+            )
+
+    def get(self, artifact_id):
+        with closing(self._connect()) as connection:
+            row = connection.execute("SELECT * FROM artifacts WHERE id = ?", (artifact_id,)).fetchone()
+        return dict(row) if row else None
+
+    def create_preview(self, artifact_id, ttl=PREVIEW_TTL):
+        """Issues an unguessable, expiring preview token for an artifact."""
+        token = secrets.token_urlsafe(24)
+        now = time.time()
+        with closing(self._connect()) as connection, connection:
+            connection.execute("DELETE FROM previews WHERE expires_at < ?", (now,))
+            connection.execute(
+                "INSERT INTO previews (token, artifact_id, expires_at) VALUES (?, ?, ?)",
+                (token, artifact_id, now + ttl)
+            )
+        return token
+
+    def resolve_preview(self, token):
+        """Returns the artifact behind a preview token, or None if it is unknown or expired."""
+        with closing(self._connect()) as connection:
+            row = connection.execute(
+                "SELECT a.* FROM previews p JOIN artifacts a ON a.id = p.artifact_id "
+                "WHERE p.token = ? AND p.expires_at >= ?",
+                (token, time.time())
+            ).fetchone()
+        return dict(row) if row else None
+
+    def recent_for_user(self, user_id, limit=5, published_only=False):
+        """The user's latest pages, leaving out versions they were offered but never picked."""
+        query = "SELECT * FROM artifacts WHERE user_id = ? AND (kind != 'variant' OR branch_name IS NOT NULL)"
+        if published_only:
+            query += " AND branch_name IS NOT NULL"
+        with closing(self._connect()) as connection:
+            rows = connection.execute(f"{query} ORDER BY id DESC LIMIT ?", (user_id, limit)).fetchall()
+        return [dict(row) for row in rows]
+
+    def record_token_usage(self, user_id, page_type, kind, usage):
+        """Records the Gemini tokens one job (or speculative generation) used."""
+        with closing(self._connect()) as connection, connection:
+            connection.execute(
+                "INSERT INTO token_usage (user_id, page_type, kind, calls, prompt_tokens, cached_tokens, "
+                "output_tokens, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (user_id, page_type, kind, usage['calls'], usage['prompt_tokens'], usage['cached_tokens'],
+                 usage['output_tokens'], time.time())
+            )
+
+    def token_usage_by(self, column, since_seconds=86400, limit=10):
+        """Token totals grouped by `column` ("user_id" or "page_type"), biggest first."""
+        assert column in ("user_id", "page_type")
+        with closing(self._connect()) as connection:
+            rows = connection.execute(
+                f"SELECT {column} AS key, SUM(calls) AS calls, SUM(prompt_tokens) AS prompt_tokens, "
+                "SUM(cached_tokens) AS cached_tokens, SUM(output_tokens) AS output_tokens FROM token_usage "
+                f"WHERE created_at >= ? GROUP BY {column} "
+                "ORDER BY SUM(prompt_tokens) + SUM(output_tokens) DESC LIMIT ?",
+                (time.time() - since_seconds, limit)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+ARTIFACTS = ArtifactStore()
+
+# --- Preview server ---
+class PreviewRequestHandler(BaseHTTPRequestHandler):
+    """Serves stored artifacts at /p/<token>/ until their preview token expires."""
+
+    def do_GET(self):
+        parts = self.path.split("?", 1)[0].lstrip("/").split("/")
+        if len(parts) not in (2, 3) or parts[0] != "p":
+            self.send_error(404)
+            return
+        
+        artifact = ARTIFACTS.resolve_preview(parts[1])
+        if not artifact:
+            self.send_error(404, "This preview has expired")
+            return
+        
+        if len(parts) == 2:
+            # The page refers to logo.png relatively, so it must be served from a directory URL
+            self.send_response(301)
+            self.send_header("Location", f"/p/{parts[1]}/")
+            self.end_headers()
+            return
         
-        if deploy_response.status_code == 201:
-            deploy_info = deploy_response.json()
-            return f"https://{subdomain_url}"
+        if parts[2] in ("", "index.html"):
+            self._send_blob(artifact['html_sha256'], "text/html; charset=utf-8")
+        elif parts[2] == "logo.png" and artifact['logo_sha256']:
+            self._send_blob(artifact['logo_sha256'], "image/png")
         else:
-            print(f"Error creating deploy: {deploy_response.text}")
-            return None
-            
-    except Exception as e:
-        print(f"Error deploying to Netlify: {e}")
+            self.send_error(404)
+
+    def _send_blob(self, digest, content_type):
+        body = ARTIFACTS.get_blob(digest)
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "private, no-store")
+        self.send_header("X-Robots-Tag", "noindex")
+        self.send_header("Referrer-Policy", "no-referrer")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_preview_server():
+    """Starts the preview HTTP server in a background thread."""
+    server = ThreadingHTTPServer((PREVIEW_HOST, PREVIEW_PORT), PreviewRequestHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="preview-server", daemon=True).start()
+    print(f"Preview server listening on {PREVIEW_HOST}:{PREVIEW_PORT} ({PREVIEW_BASE_URL})")
+    return server
+
+def preview_url(artifact_id):
+    """Returns a fresh preview link for an artifact, or None when previews are disabled."""
+    if not PREVIEW_PORT or not PREVIEW_BASE_URL:
         return None
+    return f"{PREVIEW_BASE_URL.rstrip('/')}/p/{ARTIFACTS.create_preview(artifact_id)}/"
+
+# --- Durable job queue ---
+class JobQueue:
+    """SQLite-backed queue that hands jobs from the bot process to worker processes.
+
+    Workers lease a job and renew the lease while it runs. A job held by a
+    crashed worker is picked up again once its lease runs out. Progress and
+    result messages come back through the job_events table for the bot to deliver.
+    """
+
+    def __init__(self, path=JOB_QUEUE_DB, lease_seconds=JOB_LEASE_SECONDS, max_attempts=JOB_MAX_ATTEMPTS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._initialized = False
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        if not self._initialized:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    worker TEXT,
+                    lease_until REAL,
+                    created_at REAL NOT NULL
+                )
+            """)
+            connection.execute("CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, id)")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS breakers (
+                    worker TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    snapshot TEXT NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (worker, name)
+                )
+            """)
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS worker_metrics (
+                    worker TEXT PRIMARY KEY,
+                    metrics TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS job_events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    job_id INTEGER NOT NULL,
+                    text TEXT NOT NULL,
+                    reply_markup TEXT,
+                    final INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            self._initialized = True
+        return connection
+
+    def enqueue(self, kind, job):
+        with closing(self._connect()) as connection:
+            cursor = connection.execute(
+                "INSERT INTO jobs (kind, payload, created_at) VALUES (?, ?, ?)",
+                (kind, json.dumps(job), time.time())
+            )
+            return cursor.lastrowid
+
+    def claim(self, worker_name):
+        """Leases the oldest runnable job. Returns (job_id, kind, job) or None."""
+        with closing(self._connect()) as connection:
+            while True:
+                now = time.time()
+                connection.execute("BEGIN IMMEDIATE")
+                try:
+                    row = connection.execute(
+                        "SELECT id, kind, payload, attempts FROM jobs "
+                        "WHERE (status = 'queued' AND (lease_until IS NULL OR lease_until <= ?)) "
+                        "OR (status = 'running' AND lease_until < ?) "
+                        "ORDER BY id LIMIT 1",
+                        (now, now)
+                    ).fetchone()
+                    if row is None:
+                        connection.execute("COMMIT")
+                        return None
+                    
+                    if row['attempts'] >= self.max_attempts:
+                        # Every worker that took this job died on it; give up and tell the user
+                        connection.execute("UPDATE jobs SET status = 'failed' WHERE id = ?", (row['id'],))
+                        connection.execute(
+                            "INSERT INTO job_events (job_id, text, final) VALUES (?, ?, 1)",
+                            (row['id'], "❌ Something went wrong while processing your request. Please try again.")
+                        )
+                        connection.execute("COMMIT")
+                        continue
+                    
+                    connection.execute(
+                        "UPDATE jobs SET status = 'running', attempts = attempts + 1, worker = ?, lease_until = ? "
+                        "WHERE id = ?",
+                        (worker_name, now + self.lease_seconds, row['id'])
+                    )
+                    connection.execute("COMMIT")
+                    return row['id'], row['kind'], json.loads(row['payload'])
+                except BaseException:
+                    connection.execute("ROLLBACK")
+                    raise
+
+    def heartbeat(self, job_id):
+        with closing(self._connect()) as connection:
+            connection.execute(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND status = 'running'",
+                (time.time() + self.lease_seconds, job_id)
+            )
+
+    def defer(self, job_id, delay, job=None):
+        """Puts a running job back in the queue, to be claimed again after `delay` seconds.
+
+        Deferring doesn't use up one of the job's attempts. Passing `job` stores its
+        current payload, so progress the job recorded in it carries over to the retry.
+        """
+        payload = json.dumps(job) if job is not None else None
+        with closing(self._connect()) as connection:
+            connection.execute(
+                "UPDATE jobs SET status = 'queued', worker = NULL, attempts = attempts - 1, lease_until = ?, "
+                "payload = COALESCE(?, payload) WHERE id = ?",
+                (time.time() + delay, payload, job_id)
+            )
+
+    def report_breakers(self, worker_name, snapshots):
+        """Stores a worker's circuit breaker states for the bot process to show."""
+        with closing(self._connect()) as connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO breakers (worker, name, snapshot, updated_at) VALUES (?, ?, ?, ?)",
+                [(worker_name, snapshot['name'], json.dumps(snapshot), time.time()) for snapshot in snapshots]
+            )
+
+    def report_metrics(self, worker_name, exported):
+        """Stores a worker's latency and counter metrics for /stats."""
+        with closing(self._connect()) as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO worker_metrics (worker, metrics, updated_at) VALUES (?, ?, ?)",
+                (worker_name, json.dumps(exported), time.time())
+            )
+
+    def metrics_reports(self, max_age=300):
+        """Metrics reported by workers in the last `max_age` seconds."""
+        with closing(self._connect()) as connection:
+            rows = connection.execute(
+                "SELECT metrics FROM worker_metrics WHERE updated_at >= ?", (time.time() - max_age,)
+            ).fetchall()
+        return [json.loads(row['metrics']) for row in rows]
+
+    def breaker_reports(self, max_age=300):
+        """Breaker states reported by workers in the last `max_age` seconds."""
+        with closing(self._connect()) as connection:
+            rows = connection.execute(
+                "SELECT snapshot FROM breakers WHERE updated_at >= ?", (time.time() - max_age,)
+            ).fetchall()
+        return [json.loads(row['snapshot']) for row in rows]
+
+    def finish(self, job_id, status="done"):
+        with closing(self._connect()) as connection:
+            connection.execute("UPDATE jobs SET status = ?, lease_until = NULL WHERE id = ?", (status, job_id))
+
+    def add_event(self, job_id, text, reply_markup=None, final=False):
+        with closing(self._connect()) as connection:
+            connection.execute(
+                "INSERT INTO job_events (job_id, text, reply_markup, final) VALUES (?, ?, ?, ?)",
+                (job_id, text, reply_markup, int(final))
+            )
+
+    def take_events(self, limit=100):
+        """Removes and returns pending job messages, oldest first, with their job's payload."""
+        with closing(self._connect()) as connection:
+            rows = connection.execute(
+                "SELECT e.id, e.text, e.reply_markup, e.final, j.payload FROM job_events e "
+                "JOIN jobs j ON j.id = e.job_id ORDER BY e.id LIMIT ?",
+                (limit,)
+            ).fetchall()
+            if rows:
+                connection.execute("DELETE FROM job_events WHERE id <= ?", (rows[-1]['id'],))
+        return [dict(row) for row in rows]
+
+    def counts(self):
+        """Number of jobs per status."""
+        with closing(self._connect()) as connection:
+            rows = connection.execute("SELECT status, COUNT(*) AS count FROM jobs GROUP BY status").fetchall()
+        return {row['status']: row['count'] for row in rows}
+
+JOB_QUEUE = JobQueue()
+
+# --- Outbound Telegram messages ---
+PRIORITY_FINAL = 0
+PRIORITY_PROGRESS = 1
+
+class OutboundMessage:
+    """A queued send or edit, together with everyone waiting on its result."""
+
+    def __init__(self, method, chat_id, kwargs, priority, seq, edit_key=None):
+        self.method = method
+        self.chat_id = chat_id
+        self.kwargs = kwargs
+        self.priority = priority
+        self.seq = seq
+        self.edit_key = edit_key
+        self.futures = []
+        self.coalesced = 0
+        self.parent_span = CURRENT_SPAN.get()
+        self.queued_at = time.perf_counter()
+
+class TelegramOutbox:
+    """Central scheduler for job messages sent to Telegram.
+
+    - Keeps under the global and per-chat send rates.
+    - Coalesces queued edits of the same message so only the latest text is sent.
+    - Sends final results before progress updates of other chats.
+    - Waits out RetryAfter and retries instead of failing the job.
+
+    Messages for the same chat are always delivered in the order they were queued.
+    Callers get a future and only need to await it when they care about the result.
+    """
+
+    def __init__(self, global_rate=TELEGRAM_GLOBAL_RATE, chat_interval=TELEGRAM_CHAT_INTERVAL):
+        self.global_rate = global_rate
+        self.chat_interval = chat_interval
+        self.bot = None
+        self._queues = {}
+        self._edits = {}
+        self._chat_ready_at = {}
+        self._busy = set()
+        self._sent_at = deque()
+        self._seq = itertools.count()
+        self._wakeup = None
+        self._task = None
+
+    def start(self, bot):
+        self.bot = bot
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def send_message(self, chat_id, text, reply_markup=None, final=False):
+        """Queues a new message. Returns a future for the sent Message."""
+        kwargs = {"chat_id": chat_id, "text": text, "reply_markup": reply_markup}
+        return self._enqueue("send_message", chat_id, kwargs, final)
+
+    def edit_message_text(self, chat_id, message_id, text, reply_markup=None, final=False):
+        """Queues an edit. A later edit of the same message replaces this one if it hasn't been sent yet."""
+        kwargs = {"chat_id": chat_id, "message_id": message_id, "text": text, "reply_markup": reply_markup}
+        return self._enqueue("edit_message_text", chat_id, kwargs, final, edit_key=(chat_id, message_id))
+
+    def _enqueue(self, method, chat_id, kwargs, final, edit_key=None):
+        future = asyncio.get_running_loop().create_future()
+        priority = PRIORITY_FINAL if final else PRIORITY_PROGRESS
+        
+        pending = self._edits.get(edit_key) if edit_key else None
+        if pending:
+            # Superseded edit: keep its place in the queue but send the newest text
+            pending.kwargs = kwargs
+            pending.priority = min(pending.priority, priority)
+            pending.coalesced += 1
+            pending.futures.append(future)
+            return future
+        
+        message = OutboundMessage(method, chat_id, kwargs, priority, next(self._seq), edit_key)
+        message.futures.append(future)
+        self._queues.setdefault(chat_id, deque()).append(message)
+        if edit_key:
+            self._edits[edit_key] = message
+        self._wakeup.set()
+        return future
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            now = time.monotonic()
+            
+            ready = []
+            next_ready_at = None
+            for chat_id, messages in self._queues.items():
+                if not messages or chat_id in self._busy:
+                    continue
+                ready_at = self._chat_ready_at.get(chat_id, 0)
+                if ready_at <= now:
+                    ready.append(messages[0])
+                elif next_ready_at is None or ready_at < next_ready_at:
+                    next_ready_at = ready_at
+            
+            if not ready:
+                timeout = next_ready_at - now if next_ready_at else None
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            
+            # Global rate: at most global_rate sends in any one-second window
+            while self._sent_at and now - self._sent_at[0] >= 1:
+                self._sent_at.popleft()
+            if len(self._sent_at) >= self.global_rate:
+                await asyncio.sleep(1 - (now - self._sent_at[0]))
+                continue
+            
+            message = min(ready, key=lambda m: (m.priority, m.seq))
+            self._queues[message.chat_id].popleft()
+            if message.edit_key:
+                self._edits.pop(message.edit_key, None)
+            self._busy.add(message.chat_id)
+            self._sent_at.append(now)
+            asyncio.create_task(self._deliver(message))
+
+    async def _deliver(self, message):
+        token = CURRENT_SPAN.set(message.parent_span)
+        try:
+            with span(f"telegram.{message.method}", chars=len(message.kwargs["text"])) as s:
+                s.set("queued_ms", round((time.perf_counter() - message.queued_at) * 1000, 2))
+                s.set("coalesced", message.coalesced)
+                try:
+                    result = await getattr(self.bot, message.method)(**message.kwargs)
+                except RetryAfter as e:
+                    s.set("retry_after", e.retry_after)
+                    print(f"Telegram flood limit hit for chat {message.chat_id}, retrying in {e.retry_after}s")
+                    self._chat_ready_at[message.chat_id] = time.monotonic() + e.retry_after
+                    self._requeue(message)
+                    return
+                except BadRequest as e:
+                    if "message is not modified" not in str(e).lower():
+                        raise
+                    result = None
+            
+            self._chat_ready_at[message.chat_id] = time.monotonic() + self.chat_interval
+            for future in message.futures:
+                if not future.done():
+                    future.set_result(result)
+        except Exception as e:
+            print(f"Error sending Telegram message: {e}")
+            for future in message.futures:
+                if not future.done():
+                    # Progress updates are best-effort; only final results report failures
+                    if message.priority == PRIORITY_FINAL:
+                        future.set_exception(e)
+                    else:
+                        future.set_result(None)
+        finally:
+            CURRENT_SPAN.reset(token)
+            self._busy.discard(message.chat_id)
+            self._wakeup.set()
+
+    def _requeue(self, message):
+        queued = self._queues.setdefault(message.chat_id, deque())
+        pending = self._edits.get(message.edit_key) if message.edit_key else None
+        if pending:
+            # A newer edit arrived while this one was in flight; fold this one into it
+            pending.futures.extend(message.futures)
+            pending.priority = min(pending.priority, message.priority)
+            return
+        queued.appendleft(message)
+        if message.edit_key:
+            self._edits[message.edit_key] = message
+
+OUTBOX = TelegramOutbox()
 
 # --- Telegram Bot Command Handlers ---
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -317,6 +2271,13 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
 • You'll get a direct link to the GitHub repository
 • Automatic deployment to Netlify
 
+**Commands:**
+• /redeploy - Republish one of your past pages without regenerating it
+• /tweak <instruction> - Make a small change to your last page
+• /status - Check whether Gemini, GitHub and Netlify are working
+
+Not happy with a page? Tap "🎲 Other Versions" under the result to compare a few new versions and publish the one you like.
+
 Need help? Just ask!
     """
     
@@ -330,6 +2291,8 @@ Need help? Just ask!
 
 async def generate(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Starts the landing page creation process."""
+    cancel_speculation(context)
+    abandon_publish_prep(context)
     await update.message.reply_text(
         "🎨 Great! Let's create your landing page!\n\n"
         "First, what's the name of your channel? This will be used for the domain (channel-name.netlify.app)\n\n"
@@ -357,6 +2320,12 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     elif query.data.startswith("page_type_"):
         page_type = query.data.replace("page_type_", "")
         await page_type_callback(query, context, page_type)
+    elif query.data.startswith(CALLBACK_REDEPLOY):
+        artifact_id = int(query.data.replace(CALLBACK_REDEPLOY, ""))
+        await redeploy_from_callback(query, context, artifact_id)
+    elif query.data.startswith(CALLBACK_VARIANTS):
+        artifact_id = int(query.data.replace(CALLBACK_VARIANTS, ""))
+        await variants_from_callback(query, context, artifact_id)
 
 async def start_from_callback(query, context):
     """Handle start button callback."""
@@ -427,6 +2396,13 @@ async def help_from_callback(query, context):
 • You'll get a direct link to the GitHub repository
 • Automatic deployment to Netlify
 
+**Commands:**
+• /redeploy - Republish one of your past pages without regenerating it
+• /tweak <instruction> - Make a small change to your last page
+• /status - Check whether Gemini, GitHub and Netlify are working
+
+Not happy with a page? Tap "🎲 Other Versions" under the result to compare a few new versions and publish the one you like.
+
 Need help? Just ask!
     """
     
@@ -440,6 +2416,8 @@ Need help? Just ask!
 
 async def generate_from_callback(query, context):
     """Handle generate button callback."""
+    cancel_speculation(context)
+    abandon_publish_prep(context)
     await query.edit_message_text(
         "🎨 Great! Let's create your landing page!\n\n"
         "First, what's the name of your channel? This will be used for the domain (channel-name.netlify.app)\n\n"
@@ -461,14 +2439,16 @@ async def get_channel_name(update: Update, context: ContextTypes.DEFAULT_TYPE) -
 
 async def get_logo_image(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handles logo image upload."""
+    # Logos are kept outside the repository so syncing the repo can't clobber them
+    logo_path = os.path.join(UPLOAD_DIR, f"{update.effective_user.id}_logo.png")
+    
     if update.message.photo:
         # Get the largest photo
         photo = update.message.photo[-1]
         file = await context.bot.get_file(photo.file_id)
         
         # Download and save as logo.png
-        logo_path = os.path.join(REPO_DIR, "logo.png")
-        os.makedirs(REPO_DIR, exist_ok=True)
+        os.makedirs(UPLOAD_DIR, exist_ok=True)
         
         await file.download_to_drive(logo_path)
         context.user_data['logo_path'] = logo_path
@@ -478,8 +2458,7 @@ async def get_logo_image(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         document = update.message.document
         file = await context.bot.get_file(document.file_id)
         
-        logo_path = os.path.join(REPO_DIR, "logo.png")
-        os.makedirs(REPO_DIR, exist_ok=True)
+        os.makedirs(UPLOAD_DIR, exist_ok=True)
         
         await file.download_to_drive(logo_path)
         context.user_data['logo_path'] = logo_path
@@ -487,6 +2466,9 @@ async def get_logo_image(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         await update.message.reply_text("Please send a valid image file.")
         return LOGO_IMAGE
     
+    # Everything publishing needs except the page itself is known now
+    start_publish_prep(context)
+    
     # Show landing page types with buttons
     types_text = "🎯 Perfect! Now, what type of landing page do you want to create?\n\n"
     
@@ -511,6 +2493,7 @@ async def get_page_type(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
         return PAGE_TYPE
     
     context.user_data['page_type'] = page_type
+    start_speculation(context, update.effective_user.id)
     
     keyboard = [
         [InlineKeyboardButton("✅ Yes, add footer", callback_data=CALLBACK_FOOTER_YES)],
@@ -552,69 +2535,445 @@ async def get_footer_text(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     await create_landing_page(update, context)
     return ConversationHandler.END
 
-async def create_landing_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Creates the landing page and deploys it."""
-    channel_name = context.user_data.get('channel_name')
-    page_type = context.user_data.get('page_type')
-    footer_text = context.user_data.get('footer_text')
-    logo_path = context.user_data.get('logo_path')
+def landing_page_job(context, user_id, chat_id, message_id=None):
+    """Collects the inputs of a landing page job from the conversation state."""
+    return {
+        'user_id': user_id,
+        'chat_id': chat_id,
+        'message_id': message_id,
+        'channel_name': context.user_data.get('channel_name'),
+        'page_type': context.user_data.get('page_type'),
+        'footer_text': context.user_data.get('footer_text'),
+        'logo_path': context.user_data.get('logo_path'),
+        # Task generating the page ahead of the footer answer, if one is still valid
+        'speculation': take_speculation(context),
+        # Task preparing the branch, worktree and logo since the logo upload
+        'publish_prep': take_publish_prep(context),
+    }
+
+async def run_landing_page_job(job, send):
+    """Generates, publishes and deploys a landing page, reporting progress through `send`.
+
+    `send(text, reply_markup=None, final=False)` either sends new messages or edits
+    the user's message, depending on where the request came from. Progress updates
+    don't wait for delivery; final results do.
+    """
+    # A retry of a job whose page was already generated only needs publishing
+    if job.get('artifact_id'):
+        await redeploy_artifact(job, send)
+        return
     
-    await update.message.reply_text("🚀 Creating your landing page... This may take a moment.")
+    channel_name = job['channel_name']
+    page_type = job['page_type']
     
-    # Check for GitHub PAT and clone/pull the repo
+    with span(JOB_SPAN_NAME, channel_name=channel_name, page_type=page_type) as job_span:
+        await send("🚀 Creating your landing page... This may take a moment.")
+        
+        try:
+            async with track_token_usage(job['user_id'], page_type, "create"):
+                await generate_and_publish(job, send, job_span)
+        finally:
+            # Whatever happened, don't leave the prepared worktree behind
+            if job.get('publish_prep'):
+                await discard_publish_prep(job['publish_prep'])
+
+async def generate_and_publish(job, send, job_span):
+    """The body of a landing page job: generation, artifact, preview, then publish and deploy."""
+    user_id = job['user_id']
+    channel_name = job['channel_name']
+    page_type = job['page_type']
+    footer_text = job['footer_text']
+    logo_path = job['logo_path']
+    
+    # Check for GitHub PAT before doing any work
     if not GITHUB_PAT:
-        await update.message.reply_text("❌ GitHub Personal Access Token is not configured.")
-        return
-    
-    # Setup Git repository
-    if not setup_git_repo():
-        await update.message.reply_text("❌ Could not set up the Git repository.")
+        await send("❌ GitHub Personal Access Token is not configured.", final=True)
         return
     
-    # Generate HTML content
-    html_content = await generate_page_html(page_type, channel_name, footer_text)
+    # Use the page generated while the user answered the footer prompt, if it worked out
+    html_content = None
+    speculative_html = job.get('speculative_html')
+    if job.get('speculation'):
+        try:
+            speculative_html = await job['speculation']
+        except Exception as e:
+            print(f"Speculative generation failed: {e}")
+    if speculative_html:
+        html_content = fill_footer_placeholder(speculative_html, footer_text)
+        job_span.set("speculation", "hit" if html_content else "miss")
+        METRICS.cache_hit("speculation", bool(html_content))
+    
+    # Generate HTML content, making sure it's complete before anything is pushed or deployed
+    html_content = await generate_valid_page_html(page_type, channel_name, footer_text, html_content)
     
     if not html_content:
-        await update.message.reply_text("❌ Failed to generate the landing page. Please try again.")
+        await send("❌ Failed to generate the landing page. Please try again.", final=True)
         return
     
-    # Save HTML file
-    filename = "index.html"
-    file_path = os.path.join(REPO_DIR, filename)
+    # Keep the page so it can be republished later without the LLM
+    artifact_id = await asyncio.to_thread(
+        ARTIFACTS.record, user_id, channel_name, page_type, footer_text, html_content, logo_path
+    )
+    job['artifact_id'] = artifact_id
+    
+    # Let the user look at the page while it is published and deployed
+    progress_markup = None
+    url = await asyncio.to_thread(preview_url, artifact_id)
+    if url:
+        progress_markup = InlineKeyboardMarkup([[InlineKeyboardButton("👀 Preview now", url=url)]])
+        await send(
+            "👀 Your page is ready! Preview it now while it's being published.",
+            reply_markup=progress_markup
+        )
     
-    with open(file_path, "w", encoding="utf-8") as file:
-        file.write(html_content)
+    await publish_and_deploy(
+        send, artifact_id, html_content, channel_name, page_type, logo_path,
+        progress_markup=progress_markup, publish_prep=job.get('publish_prep')
+    )
+
+async def publish_and_deploy(send, artifact_id, html_content, channel_name, page_type, logo_path=None,
+                             commit_message=None, progress_markup=None, publish_prep=None):
+    """Pushes a page to GitHub, deploys it to Netlify and reports the final result.
+
+    `progress_markup` is attached to the progress updates, e.g. to keep a preview link visible.
+    `publish_prep` is passed on to `publish_page`.
+    """
+    # Commit and push to GitHub
+    await send("📤 Pushing to GitHub...", reply_markup=progress_markup)
+    branch_name = await publish_page(
+        html_content, f"page-{channel_name}", logo_path, commit_message, publish_prep
+    )
     
-    # Create branch name
-    branch_name = f"page-{channel_name}"
+    redeploy_button = [InlineKeyboardButton("♻️ Redeploy", callback_data=f"{CALLBACK_REDEPLOY}{artifact_id}")]
     
-    # Push to GitHub
-    await update.message.reply_text("📤 Pushing to GitHub...")
-    if push_to_github(filename, branch_name, logo_path):
+    if branch_name:
         # Deploy to Netlify
-        await update.message.reply_text("🌐 Deploying to Netlify...")
-        netlify_url = deploy_to_netlify(branch_name, channel_name)
+        await send("🌐 Deploying to Netlify...", reply_markup=progress_markup)
+        netlify_url = await asyncio.to_thread(deploy_to_netlify, branch_name, channel_name)
+        await asyncio.to_thread(ARTIFACTS.mark_published, artifact_id, branch_name, netlify_url)
         
         if netlify_url:
-            await update.message.reply_text(
+            keyboard = [
+                [InlineKeyboardButton("🔗 Open Website", url=netlify_url)],
+                [InlineKeyboardButton("🎨 Create Another", callback_data=CALLBACK_GENERATE)],
+                [InlineKeyboardButton("🏠 Main Menu", callback_data=CALLBACK_START)]
+            ]
+            if PAGE_VARIANTS > 1:
+                keyboard.insert(1, variants_button(artifact_id))
+            reply_markup = InlineKeyboardMarkup(keyboard)
+            
+            await send(
                 f"🎉 **Success! Your landing page is live!**\n\n"
                 f"🔗 **URL:** {netlify_url}\n"
                 f"📁 **Branch:** {branch_name}\n"
                 f"🎨 **Type:** {LANDING_PAGE_TYPES[page_type]}\n\n"
-                f"Your page is now accessible at the URL above!"
+                f"Your page is now accessible at the URL above!",
+                reply_markup=reply_markup,
+                final=True
             )
         else:
-            await update.message.reply_text(
+            keyboard = [
+                redeploy_button,
+                [InlineKeyboardButton("🎨 Create Another", callback_data=CALLBACK_GENERATE)],
+                [InlineKeyboardButton("🏠 Main Menu", callback_data=CALLBACK_START)]
+            ]
+            if PAGE_VARIANTS > 1:
+                keyboard.insert(1, variants_button(artifact_id))
+            reply_markup = InlineKeyboardMarkup(keyboard)
+            
+            await send(
                 f"✅ **Page created successfully!**\n\n"
                 f"📁 **Branch:** {branch_name}\n"
                 f"🎨 **Type:** {LANDING_PAGE_TYPES[page_type]}\n\n"
-                f"⚠️ Netlify deployment failed, but your page is available on GitHub."
+                f"⚠️ {netlify_failure_note()}",
+                reply_markup=reply_markup,
+                final=True
             )
     else:
-        await update.message.reply_text("❌ Failed to push to GitHub. Please check the logs.")
+        keyboard = [
+            redeploy_button,
+            [InlineKeyboardButton("🎨 Try Again", callback_data=CALLBACK_GENERATE)],
+            [InlineKeyboardButton("🏠 Main Menu", callback_data=CALLBACK_START)]
+        ]
+        reply_markup = InlineKeyboardMarkup(keyboard)
+        
+        await send(
+            "❌ Failed to push to GitHub. Please check the logs.",
+            reply_markup=reply_markup,
+            final=True
+        )
+
+def netlify_failure_note():
+    if BREAKERS["netlify"].state != "closed":
+        return "Netlify is degraded right now. Your page is on GitHub; use Redeploy once Netlify recovers."
+    return "Netlify deployment failed, but your page is available on GitHub."
+
+async def redeploy_artifact(job, send):
+    """Republishes a stored page straight to GitHub and Netlify, skipping generation."""
+    artifact_id = job['artifact_id']
+    artifact = await asyncio.to_thread(ARTIFACTS.get, artifact_id)
+    if not artifact or artifact['user_id'] != job['user_id']:
+        await send("❌ That page could not be found.", final=True)
+        return
+    
+    with span(JOB_SPAN_NAME, channel_name=artifact['channel_name'], page_type=artifact['page_type'],
+              redeploy_of=artifact_id):
+        await send(f"♻️ Redeploying your {artifact['channel_name']} page...")
+        
+        html_content = (await asyncio.to_thread(ARTIFACTS.get_blob, artifact['html_sha256'])).decode("utf-8")
+        logo_path = ARTIFACTS.blob_path(artifact['logo_sha256']) if artifact['logo_sha256'] else None
+        
+        await publish_and_deploy(
+            send, artifact_id, html_content, artifact['channel_name'], artifact['page_type'], logo_path
+        )
+
+async def generate_variants(job, send):
+    """Generates several new versions of a past page in one Gemini call and lets the user pick one.
+
+    Nothing is published here: each complete version is stored as an artifact,
+    and picking one republishes it like /redeploy.
+    """
+    artifact = await asyncio.to_thread(ARTIFACTS.get, job['artifact_id'])
+    if not artifact or artifact['user_id'] != job['user_id']:
+        await send("❌ That page could not be found.", final=True)
+        return
+    user_id = job['user_id']
+    channel_name = artifact['channel_name']
+    page_type = artifact['page_type']
+    footer_text = artifact['footer_text']
+    
+    with span(JOB_SPAN_NAME, channel_name=channel_name, page_type=page_type,
+              variants_of=artifact['id']) as job_span:
+        await send(f"🎲 Creating {PAGE_VARIANTS} new versions of your {channel_name} page... This may take a moment.")
+        
+        async with track_token_usage(user_id, page_type, "variants"):
+            candidates = await generate_page_candidates(
+                page_type, channel_name, footer_text, candidate_count=PAGE_VARIANTS
+            )
+        
+        # Check every version at once; only complete pages are offered
+        with span("landing_page.validate", variants=len(candidates)) as s:
+            reviews = await asyncio.gather(*(
+                asyncio.to_thread(review_variant, candidate, footer_text) for candidate in candidates
+            ))
+            variants = [
+                (candidate, summary) for candidate, (problems, summary) in zip(candidates, reviews) if not problems
+            ]
+            s.set("problems", len(candidates) - len(variants))
+        job_span.set("variants", len(variants))
+        
+        main_menu = [InlineKeyboardButton("🏠 Main Menu", callback_data=CALLBACK_START)]
+        if not variants:
+            await send(
+                "❌ None of the new versions came out complete. Please try again.",
+                reply_markup=InlineKeyboardMarkup([variants_button(artifact['id'], "🎲 Try Again"), main_menu]),
+                final=True
+            )
+            return
+        
+        logo_path = ARTIFACTS.blob_path(artifact['logo_sha256']) if artifact['logo_sha256'] else None
+        lines = [f"🎲 **New versions of your {channel_name} page**", ""]
+        keyboard = []
+        for number, (candidate, summary) in enumerate(variants, 1):
+            variant_id = await asyncio.to_thread(
+                ARTIFACTS.record, user_id, channel_name, page_type, footer_text, candidate, logo_path, "variant"
+            )
+            lines.append(f"{number}. {summary}")
+            row = [InlineKeyboardButton(f"✅ Publish {number}", callback_data=f"{CALLBACK_REDEPLOY}{variant_id}")]
+            url = await asyncio.to_thread(preview_url, variant_id)
+            if url:
+                row.insert(0, InlineKeyboardButton(f"👀 Preview {number}", url=url))
+            keyboard.append(row)
+        
+        if len(variants) < len(candidates):
+            lines.append(f"({len(candidates) - len(variants)} more didn't pass the page checks.)")
+        lines += ["", "Pick the one to publish:"]
+        keyboard += [variants_button(artifact['id'], "🎲 More Versions"), main_menu]
+        
+        await send("\n".join(lines), reply_markup=InlineKeyboardMarkup(keyboard), final=True)
+
+async def tweak_last_page(job, send):
+    """Edits the user's last page with a small Gemini patch and republishes only index.html."""
+    user_id = job['user_id']
+    instruction = job['instruction']
+    # The page that's live on the user's branch, not a version they didn't pick
+    artifacts = await asyncio.to_thread(ARTIFACTS.recent_for_user, user_id, 1, True)
+    if not artifacts:
+        await send("❌ You haven't published any landing pages yet.", final=True)
+        return
+    artifact = artifacts[0]
+    
+    with span(JOB_SPAN_NAME, channel_name=artifact['channel_name'], page_type=artifact['page_type'],
+              tweak_of=artifact['id']):
+        await send(f"✏️ Tweaking your {artifact['channel_name']} page...")
+        
+        html_content = (await asyncio.to_thread(ARTIFACTS.get_blob, artifact['html_sha256'])).decode("utf-8")
+        async with track_token_usage(user_id, artifact['page_type'], "tweak"):
+            edits = await generate_page_patch(html_content, instruction)
+        if edits is None:
+            await send("❌ Failed to work out the changes. Please try again.", final=True)
+            return
+        
+        new_html, error = apply_page_patch(html_content, edits)
+        if error:
+            await send(f"❌ Couldn't apply the changes: {error}. Try rephrasing the instruction.", final=True)
+            return
+        
+        logo_path = ARTIFACTS.blob_path(artifact['logo_sha256']) if artifact['logo_sha256'] else None
+        artifact_id = await asyncio.to_thread(
+            ARTIFACTS.record, user_id, artifact['channel_name'], artifact['page_type'],
+            artifact['footer_text'], new_html, logo_path
+        )
+        
+        # The logo is already on the branch, so only index.html is committed
+        await publish_and_deploy(
+            send, artifact_id, new_html, artifact['channel_name'], artifact['page_type'],
+            commit_message=f"feat: tweak landing page ({len(edits)} edit(s))"
+        )
+
+# --- Job dispatch ---
+def queue_outbound(chat_id, message_id, text, reply_markup=None, final=False):
+    """Sends a job message as a new message, or as an edit when the job started from a button."""
+    if message_id:
+        return OUTBOX.edit_message_text(chat_id, message_id, text, reply_markup, final)
+    return OUTBOX.send_message(chat_id, text, reply_markup, final)
+
+def make_sender(chat_id, message_id=None):
+    """Builds the `send` callback a job uses to report to its chat."""
+    async def send(text, reply_markup=None, final=False):
+        sent = queue_outbound(chat_id, message_id, text, reply_markup, final)
+        return await sent if final else sent
+    
+    return send
+
+JOB_RUNNERS = {
+    "create": run_landing_page_job,
+    "redeploy": redeploy_artifact,
+    "tweak": tweak_last_page,
+    "variants": generate_variants,
+}
+
+# Upstreams a job can't do without; Netlify isn't one, as a page on GitHub can be redeployed later
+JOB_UPSTREAMS = {
+    "create": ("gemini", "github"),
+    "redeploy": ("github",),
+    "tweak": ("gemini", "github"),
+    # Picking a version publishes it as a separate redeploy job
+    "variants": ("gemini",),
+}
+
+# Jobs waiting for a degraded upstream to recover, kept referenced until they run
+DEFERRED_JOBS = set()
+
+# Jobs running in this process
+JOB_STATS = {'in_flight': 0}
+
+BREAKER_SEVERITY = {"closed": 0, "half_open": 1, "open": 2}
+
+def breaker_snapshots_local():
+    """Circuit breaker states of this process."""
+    return [breaker.snapshot() for breaker in BREAKERS.values()]
+
+def breaker_snapshots():
+    """Current circuit breaker states, merged across the worker processes when they are enabled."""
+    local = breaker_snapshots_local()
+    if WORKER_PROCESSES == 0:
+        return local
+    
+    # Show the worst state any worker is in, with the recent calls of all of them
+    merged = {}
+    for snapshot in JOB_QUEUE.breaker_reports():
+        current = merged.get(snapshot['name'])
+        if current is None:
+            merged[snapshot['name']] = dict(snapshot)
+            continue
+        calls, failures = current['calls'] + snapshot['calls'], current['failures'] + snapshot['failures']
+        if BREAKER_SEVERITY[snapshot['state']] > BREAKER_SEVERITY[current['state']]:
+            current.update(snapshot)
+        current['calls'], current['failures'] = calls, failures
+    return [merged.get(snapshot['name'], snapshot) for snapshot in local]
+
+def degraded_upstream(kind, snapshots):
+    """Returns the breaker snapshot of an upstream the job needs that isn't taking calls, or None."""
+    for snapshot in snapshots:
+        if snapshot['name'] in JOB_UPSTREAMS[kind] and snapshot['state'] != "closed" and snapshot['retry_after'] > 0:
+            return snapshot
+    return None
+
+async def announce_retry(job, error, send):
+    """Tells the user their job waits for a degraded upstream. Returns False once it has waited too long."""
+    if time.time() - job.get('submitted_at', time.time()) > DEGRADED_MAX_WAIT:
+        await send(f"❌ {error.label} is still unavailable. Please try again later.", final=True)
+        return False
+    
+    await send(
+        f"⚠️ {error.label} is degraded right now, so your request is queued for retry. "
+        f"I'll carry on automatically in about {max(1, round(error.retry_after))}s."
+    )
+    return True
+
+async def retry_later(kind, job, delay):
+    await asyncio.sleep(max(1, delay))
+    await submit_job(kind, job)
+
+async def submit_job(kind, job):
+    """Runs a job in this process, or queues it for the worker processes when they are enabled.
+
+    A job that needs a degraded upstream is answered right away and retried once the
+    upstream's circuit breaker lets calls through again.
+    """
+    job.setdefault('submitted_at', time.time())
+    
+    if WORKER_PROCESSES > 0:
+        degraded = degraded_upstream(kind, await asyncio.to_thread(breaker_snapshots))
+        if degraded:
+            queue_outbound(
+                job['chat_id'], job.get('message_id'),
+                f"⚠️ {degraded['label']} is degraded right now, so your request is queued for retry."
+            )
+        else:
+            queue_outbound(job['chat_id'], job.get('message_id'), "⏳ Your request is queued and will start shortly.")
+        # Tasks can't cross processes, so the speculative page itself is queued
+        speculation = job.pop('speculation', None)
+        if speculation:
+            try:
+                job['speculative_html'] = await speculation
+            except Exception as e:
+                print(f"Speculative generation failed: {e}")
+        await asyncio.to_thread(JOB_QUEUE.enqueue, kind, job)
+        return
+    
+    send = make_sender(job['chat_id'], job.get('message_id'))
+    try:
+        degraded = degraded_upstream(kind, breaker_snapshots())
+        if degraded:
+            raise UpstreamUnavailable(degraded['label'], degraded['retry_after'])
+        JOB_STATS['in_flight'] += 1
+        try:
+            await JOB_RUNNERS[kind](job, send)
+        finally:
+            JOB_STATS['in_flight'] -= 1
+    except UpstreamUnavailable as e:
+        if await announce_retry(job, e, send):
+            task = asyncio.create_task(retry_later(kind, job, e.retry_after))
+            DEFERRED_JOBS.add(task)
+            task.add_done_callback(DEFERRED_JOBS.discard)
+    except Exception as e:
+        # Like run_queued_job: never leave the user looking at a progress message
+        print(f"{kind.capitalize()} job failed: {e}")
+        try:
+            await send("❌ Something went wrong while processing your request. Please try again.", final=True)
+        except Exception as send_error:
+            print(f"Could not report the failure to the user: {send_error}")
+
+async def create_landing_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Creates the landing page and deploys it."""
+    await submit_job("create", landing_page_job(context, update.effective_user.id, update.effective_chat.id))
 
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Cancels the conversation."""
+    cancel_speculation(context)
+    abandon_publish_prep(context)
     await update.message.reply_text("❌ Landing page creation cancelled.")
     return ConversationHandler.END
 
@@ -625,6 +2984,7 @@ async def page_type_callback(query, context, page_type):
         return
     
     context.user_data['page_type'] = page_type
+    start_speculation(context, query.from_user.id)
     
     keyboard = [
         [InlineKeyboardButton("✅ Yes, add footer", callback_data=CALLBACK_FOOTER_YES)],
@@ -654,6 +3014,8 @@ async def footer_no_callback(query, context):
 
 async def cancel_from_callback(query, context):
     """Handle cancel callback."""
+    cancel_speculation(context)
+    abandon_publish_prep(context)
     await query.edit_message_text(
         "❌ Landing page creation cancelled.\n\n"
         "Click the button below to start over:",
@@ -664,88 +3026,171 @@ async def cancel_from_callback(query, context):
 
 async def create_landing_page_from_callback(query, context):
     """Creates the landing page from callback."""
-    channel_name = context.user_data.get('channel_name')
-    page_type = context.user_data.get('page_type')
-    footer_text = context.user_data.get('footer_text')
-    logo_path = context.user_data.get('logo_path')
-    
-    await query.edit_message_text("🚀 Creating your landing page... This may take a moment.")
-    
-    # Check for GitHub PAT and clone/pull the repo
-    if not GITHUB_PAT:
-        await query.edit_message_text("❌ GitHub Personal Access Token is not configured.")
+    await submit_job("create", landing_page_job(
+        context, query.from_user.id, query.message.chat_id, query.message.message_id
+    ))
+
+async def redeploy_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Republishes a past page: `/redeploy <id>`, or pick one of your recent pages."""
+    user_id = update.effective_user.id
+    
+    if context.args:
+        if not context.args[0].isdigit():
+            await update.message.reply_text("Usage: /redeploy [page number]")
+            return
+        
+        await submit_job("redeploy", {
+            'artifact_id': int(context.args[0]),
+            'user_id': user_id,
+            'chat_id': update.effective_chat.id,
+        })
         return
     
-    # Setup Git repository
-    if not setup_git_repo():
-        await query.edit_message_text("❌ Could not set up the Git repository.")
+    artifacts = await asyncio.to_thread(ARTIFACTS.recent_for_user, user_id)
+    if not artifacts:
+        await update.message.reply_text("You haven't created any landing pages yet.")
         return
     
-    # Generate HTML content
-    html_content = await generate_page_html(page_type, channel_name, footer_text)
+    keyboard = []
+    for artifact in artifacts:
+        page_type_name = LANDING_PAGE_TYPES.get(artifact['page_type'], '').split(' - ')[0]
+        keyboard.append([InlineKeyboardButton(
+            f"♻️ #{artifact['id']} {artifact['channel_name']} ({page_type_name}) {artifact['created_at'][:10]}",
+            callback_data=f"{CALLBACK_REDEPLOY}{artifact['id']}"
+        )])
+    keyboard.append([InlineKeyboardButton("🏠 Main Menu", callback_data=CALLBACK_START)])
     
-    if not html_content:
-        await query.edit_message_text("❌ Failed to generate the landing page. Please try again.")
+    await update.message.reply_text(
+        "♻️ Which page do you want to redeploy?", reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+
+async def tweak_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Applies a small change to the user's last page: `/tweak <instruction>`."""
+    instruction = " ".join(context.args).strip()
+    if not instruction:
+        await update.message.reply_text(
+            "Usage: /tweak <instruction>\n\n"
+            "For example: /tweak change the headline to 'Join us today'"
+        )
         return
     
-    # Save HTML file
-    filename = "index.html"
-    file_path = os.path.join(REPO_DIR, filename)
-    
-    with open(file_path, "w", encoding="utf-8") as file:
-        file.write(html_content)
-    
-    # Create branch name
-    branch_name = f"page-{channel_name}"
-    
-    # Push to GitHub
-    await query.edit_message_text("📤 Pushing to GitHub...")
-    if push_to_github(filename, branch_name, logo_path):
-        # Deploy to Netlify
-        await query.edit_message_text("🌐 Deploying to Netlify...")
-        netlify_url = deploy_to_netlify(branch_name, channel_name)
-        
-        if netlify_url:
-            keyboard = [
-                [InlineKeyboardButton("🔗 Open Website", url=netlify_url)],
-                [InlineKeyboardButton("🎨 Create Another", callback_data=CALLBACK_GENERATE)],
-                [InlineKeyboardButton("🏠 Main Menu", callback_data=CALLBACK_START)]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            await query.edit_message_text(
-                f"🎉 **Success! Your landing page is live!**\n\n"
-                f"🔗 **URL:** {netlify_url}\n"
-                f"📁 **Branch:** {branch_name}\n"
-                f"🎨 **Type:** {LANDING_PAGE_TYPES[page_type]}\n\n"
-                f"Your page is now accessible at the URL above!",
-                reply_markup=reply_markup
+    await submit_job("tweak", {
+        'instruction': instruction,
+        'user_id': update.effective_user.id,
+        'chat_id': update.effective_chat.id,
+    })
+
+async def status_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Shows how Gemini, GitHub and Netlify are doing, as seen by their circuit breakers."""
+    lines = ["🩺 **Service status**", ""]
+    for snapshot in await asyncio.to_thread(breaker_snapshots):
+        if snapshot['state'] == "closed":
+            lines.append(
+                f"🟢 {snapshot['label']}: OK ({snapshot['failures']} of {snapshot['calls']} recent calls failed)"
             )
+        elif snapshot['state'] == "half_open":
+            lines.append(f"🟡 {snapshot['label']}: recovering, testing with a single request")
         else:
-            keyboard = [
-                [InlineKeyboardButton("🎨 Create Another", callback_data=CALLBACK_GENERATE)],
-                [InlineKeyboardButton("🏠 Main Menu", callback_data=CALLBACK_START)]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            await query.edit_message_text(
-                f"✅ **Page created successfully!**\n\n"
-                f"📁 **Branch:** {branch_name}\n"
-                f"🎨 **Type:** {LANDING_PAGE_TYPES[page_type]}\n\n"
-                f"⚠️ Netlify deployment failed, but your page is available on GitHub.",
-                reply_markup=reply_markup
-            )
+            lines.append(f"🔴 {snapshot['label']}: degraded, next try in {round(snapshot['retry_after'])}s")
+    
+    await update.message.reply_text("\n".join(lines))
+
+def collect_metrics():
+    """This process's metrics, merged with those the workers reported."""
+    metrics = Metrics()
+    metrics.merge(METRICS.export())
+    if WORKER_PROCESSES > 0:
+        for exported in JOB_QUEUE.metrics_reports():
+            metrics.merge(exported)
+    return metrics
+
+def format_ms(duration_ms):
+    return f"{duration_ms / 1000:.1f}s" if duration_ms >= 1000 else f"{duration_ms:.0f}ms"
+
+def stats_text():
+    """Builds the /stats report."""
+    metrics = collect_metrics()
+    lines = ["📊 **Bot stats**", "", "⏱️ **Latency, last hour** (p50 / p95 / p99, count)"]
+    for stage in sorted(metrics.latencies):
+        buckets = metrics.latencies[stage].totals()
+        if buckets:
+            p50, p95, p99 = (format_ms(percentile(buckets, fraction)) for fraction in (0.5, 0.95, 0.99))
+            lines.append(f"• {stage}: {p50} / {p95} / {p99} ({sum(buckets.values())})")
+    
+    lines += ["", "🧵 **Jobs**"]
+    if WORKER_PROCESSES > 0:
+        counts = JOB_QUEUE.counts()
+        lines.append(f"• {counts.get('running', 0)} in flight, {counts.get('queued', 0)} queued")
     else:
-        keyboard = [
-            [InlineKeyboardButton("🎨 Try Again", callback_data=CALLBACK_GENERATE)],
-            [InlineKeyboardButton("🏠 Main Menu", callback_data=CALLBACK_START)]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await query.edit_message_text(
-            "❌ Failed to push to GitHub. Please check the logs.",
-            reply_markup=reply_markup
-        )
+        lines.append(f"• {JOB_STATS['in_flight']} in flight, {len(DEFERRED_JOBS)} waiting for retry")
+    
+    lines += ["", "💾 **Cache hit rates, last hour**"]
+    for name in sorted(metrics.counters):
+        if name.startswith("cache."):
+            totals = metrics.counters[name].totals()
+            hits, calls = totals.get("hit", 0), totals.get("hit", 0) + totals.get("miss", 0)
+            if calls:
+                lines.append(f"• {name[len('cache.'):]}: {hits / calls:.0%} ({hits}/{calls})")
+    
+    lines += ["", "🤖 **Gemini**"]
+    gemini = metrics.counters.get("gemini", MinuteRing())
+    for minutes in (5, 60):
+        totals = gemini.totals(minutes)
+        calls = totals.get("calls", 0)
+        if calls:
+            lines.append(
+                f"• Last {minutes} min: {calls} calls, {totals.get('errors', 0) / calls:.0%} errors, "
+                f"{totals.get('rate_limited', 0) / calls:.0%} rate limited (429)"
+            )
+        else:
+            lines.append(f"• Last {minutes} min: no calls")
+    
+    git = metrics.counters.get("git", MinuteRing()).totals()
+    if git.get("commands"):
+        lines += ["", "🔧 **Git, last hour**",
+                  f"• {git['commands']} commands, {git.get('failures', 0)} failed, {git.get('timeouts', 0)} timed out"]
+    
+    def format_usage(row):
+        return (f"{row['calls']} calls, {row['prompt_tokens'] / 1000:.1f}k in "
+                f"({row['cached_tokens'] / 1000:.1f}k cached), {row['output_tokens'] / 1000:.1f}k out")
+    
+    lines += ["", "🪙 **Gemini tokens, last 24 hours**"]
+    for row in ARTIFACTS.token_usage_by("page_type"):
+        page_type_name = LANDING_PAGE_TYPES.get(row['key'], 'Other').split(' - ')[0]
+        lines.append(f"• {page_type_name}: {format_usage(row)}")
+    top_users = ARTIFACTS.token_usage_by("user_id", limit=5)
+    if top_users:
+        lines.append("Top users:")
+        for row in top_users:
+            lines.append(f"• {row['key']}: {format_usage(row)}")
+    
+    return "\n".join(lines)
+
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Shows latency, job, cache and Gemini error statistics to admins."""
+    if update.effective_user.id not in ADMIN_IDS:
+        await update.message.reply_text("❌ This command is only available to bot admins.")
+        return
+    
+    await update.message.reply_text(await asyncio.to_thread(stats_text))
+
+async def redeploy_from_callback(query, context, artifact_id):
+    """Handle redeploy button callback."""
+    await submit_job("redeploy", {
+        'artifact_id': artifact_id,
+        'user_id': query.from_user.id,
+        'chat_id': query.message.chat_id,
+        'message_id': query.message.message_id,
+    })
+
+async def variants_from_callback(query, context, artifact_id):
+    """Handle other versions button callback."""
+    await submit_job("variants", {
+        'artifact_id': artifact_id,
+        'user_id': query.from_user.id,
+        'chat_id': query.message.chat_id,
+        'message_id': query.message.message_id,
+    })
 
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handles text messages during conversation flow."""
@@ -788,97 +3233,252 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 
 async def create_landing_page_from_message(update, context):
     """Creates the landing page from message flow."""
-    channel_name = context.user_data.get('channel_name')
-    page_type = context.user_data.get('page_type')
-    footer_text = context.user_data.get('footer_text')
-    logo_path = context.user_data.get('logo_path')
-    
-    await update.message.reply_text("🚀 Creating your landing page... This may take a moment.")
-    
-    # Check for GitHub PAT and clone/pull the repo
-    if not GITHUB_PAT:
-        await update.message.reply_text("❌ GitHub Personal Access Token is not configured.")
-        return
-    
-    # Setup Git repository
-    if not setup_git_repo():
-        await update.message.reply_text("❌ Could not set up the Git repository.")
-        return
-    
-    # Generate HTML content
-    html_content = await generate_page_html(page_type, channel_name, footer_text)
-    
-    if not html_content:
-        await update.message.reply_text("❌ Failed to generate the landing page. Please try again.")
-        return
-    
-    # Save HTML file
-    filename = "index.html"
-    file_path = os.path.join(REPO_DIR, filename)
-    
-    with open(file_path, "w", encoding="utf-8") as file:
-        file.write(html_content)
-    
-    # Create branch name
-    branch_name = f"page-{channel_name}"
-    
-    # Push to GitHub
-    await update.message.reply_text("📤 Pushing to GitHub...")
-    if push_to_github(filename, branch_name, logo_path):
-        # Deploy to Netlify
-        await update.message.reply_text("🌐 Deploying to Netlify...")
-        netlify_url = deploy_to_netlify(branch_name, channel_name)
+    await submit_job("create", landing_page_job(context, update.effective_user.id, update.effective_chat.id))
+
+# --- Update processing ---
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """Processes updates concurrently, but one at a time per chat.
+
+    Different users' updates run in parallel, up to MAX_CONCURRENT_UPDATES,
+    while each chat's messages and button presses are handled in the order they
+    arrived, so its conversation_state transitions can't race. An update only
+    takes one of the slots once it's its chat's turn, so a busy chat can't
+    hold up the others.
+    """
+
+    # PTB takes its own semaphore before `do_process_update`, where an update
+    # can't have its chat's lock yet, so that one is left effectively unbounded
+    UNBOUNDED = 2 ** 31 - 1
+
+    def __init__(self, max_concurrent_updates):
+        super().__init__(self.UNBOUNDED)
+        self._handler_slots = asyncio.Semaphore(max_concurrent_updates)
+        # Chat ID -> [lock, number of updates holding or waiting for it]
+        self._chats = {}
+
+    @staticmethod
+    def chat_key(update):
+        if isinstance(update, Update):
+            if update.effective_chat:
+                return update.effective_chat.id
+            if update.effective_user:
+                return update.effective_user.id
+        return None
+
+    async def do_process_update(self, update, coroutine):
+        key = self.chat_key(update)
+        if key is None:
+            async with self._handler_slots:
+                await coroutine
+            return
         
-        if netlify_url:
-            keyboard = [
-                [InlineKeyboardButton("🔗 Open Website", url=netlify_url)],
-                [InlineKeyboardButton("🎨 Create Another", callback_data=CALLBACK_GENERATE)],
-                [InlineKeyboardButton("🏠 Main Menu", callback_data=CALLBACK_START)]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
+        chat = self._chats.setdefault(key, [asyncio.Lock(), 0])
+        chat[1] += 1
+        try:
+            async with chat[0], self._handler_slots:
+                await coroutine
+        finally:
+            chat[1] -= 1
+            if not chat[1]:
+                del self._chats[key]
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+# --- Startup and background tasks ---
+async def refresh_repo_periodically():
+    """Keeps the base branch fresh so jobs never fetch on the request path.
+
+    Only origin/<base> is updated, without REPO_LOCK; each job's checkout of the
+    base branch picks up the new tip.
+    """
+    while True:
+        await asyncio.sleep(GIT_FETCH_INTERVAL)
+        try:
+            if os.path.exists(os.path.join(REPO_DIR, ".git")):
+                await fetch_base_branch()
+            else:
+                async with REPO_LOCK:
+                    await setup_git_repo()
+        except Exception as e:
+            print(f"Error refreshing repository: {e}")
+
+async def warm_up_repo():
+    """Clones or syncs the repository, then keeps it fresh in a background task."""
+    print("Warming up the landing pages repository...")
+    try:
+        async with REPO_LOCK:
+            await prune_worktrees()
+            if await setup_git_repo():
+                print("Repository is ready.")
+            else:
+                print("Warm-up failed, jobs will sync the repository on demand.")
+    finally:
+        REPO_READY.set()
+    
+    return asyncio.create_task(refresh_repo_periodically())
+
+# --- Worker processes ---
+def worker_process(index):
+    """Entry point of a worker process: runs queued jobs until it is terminated."""
+    global REPO_DIR
+    # Each worker has its own clone, so workers never share a working tree
+    REPO_DIR = f"{REPO_DIR}-worker-{index}"
+    TRACE_EXPORTER.path = f"{TRACE_FILE}.worker-{index}"
+    try:
+        asyncio.run(run_worker(f"worker-{index}"))
+    except KeyboardInterrupt:
+        pass
+
+async def run_worker(name):
+    print(f"{name} started (pid {os.getpid()}).")
+    refresh_task = await warm_up_repo()
+    last_report = 0
+    try:
+        while True:
+            # Let the bot process see this worker's breakers and metrics for /status, /stats and new jobs
+            if time.monotonic() - last_report >= 5:
+                await asyncio.to_thread(JOB_QUEUE.report_breakers, name, breaker_snapshots_local())
+                await asyncio.to_thread(JOB_QUEUE.report_metrics, name, METRICS.export())
+                last_report = time.monotonic()
             
-            await update.message.reply_text(
-                f"🎉 **Success! Your landing page is live!**\n\n"
-                f"🔗 **URL:** {netlify_url}\n"
-                f"📁 **Branch:** {branch_name}\n"
-                f"🎨 **Type:** {LANDING_PAGE_TYPES[page_type]}\n\n"
-                f"Your page is now accessible at the URL above!",
-                reply_markup=reply_markup
-            )
-        else:
-            keyboard = [
-                [InlineKeyboardButton("🎨 Create Another", callback_data=CALLBACK_GENERATE)],
-                [InlineKeyboardButton("🏠 Main Menu", callback_data=CALLBACK_START)]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            claimed = await asyncio.to_thread(JOB_QUEUE.claim, name)
+            if not claimed:
+                await asyncio.sleep(WORKER_POLL_INTERVAL)
+                continue
             
-            await update.message.reply_text(
-                f"✅ **Page created successfully!**\n\n"
-                f"📁 **Branch:** {branch_name}\n"
-                f"🎨 **Type:** {LANDING_PAGE_TYPES[page_type]}\n\n"
-                f"⚠️ Netlify deployment failed, but your page is available on GitHub.",
-                reply_markup=reply_markup
+            job_id, kind, job = claimed
+            await run_queued_job(job_id, kind, job)
+    finally:
+        refresh_task.cancel()
+        await asyncio.to_thread(TRACE_EXPORTER.close)
+
+async def run_queued_job(job_id, kind, job):
+    """Runs one claimed job, sending its messages back to the bot through the queue."""
+    async def send(text, reply_markup=None, final=False):
+        markup = json.dumps(reply_markup.to_dict()) if reply_markup else None
+        await asyncio.to_thread(JOB_QUEUE.add_event, job_id, text, markup, final)
+    
+    async def keep_lease():
+        while True:
+            await asyncio.sleep(JOB_QUEUE.lease_seconds / 3)
+            await asyncio.to_thread(JOB_QUEUE.heartbeat, job_id)
+    
+    heartbeat = asyncio.create_task(keep_lease())
+    status = "done"
+    try:
+        degraded = degraded_upstream(kind, breaker_snapshots_local())
+        if degraded:
+            raise UpstreamUnavailable(degraded['label'], degraded['retry_after'])
+        await JOB_RUNNERS[kind](job, send)
+    except UpstreamUnavailable as e:
+        if await announce_retry(job, e, send):
+            await asyncio.to_thread(JOB_QUEUE.defer, job_id, e.retry_after, job)
+            status = None
+        else:
+            status = "failed"
+    except Exception as e:
+        status = "failed"
+        print(f"Job {job_id} failed: {e}")
+        await send("❌ Something went wrong while processing your request. Please try again.", final=True)
+    finally:
+        heartbeat.cancel()
+        if status:
+            await asyncio.to_thread(JOB_QUEUE.finish, job_id, status)
+
+def start_worker(index):
+    process = multiprocessing.get_context("spawn").Process(
+        target=worker_process, args=(index,), name=f"worker-{index}", daemon=True
+    )
+    process.start()
+    return process
+
+async def supervise_workers(workers):
+    """Restarts worker processes that died; the jobs they held are re-leased after their lease expires."""
+    while True:
+        await asyncio.sleep(5)
+        for index, process in enumerate(workers):
+            if not process.is_alive():
+                print(f"Worker {index} exited with code {process.exitcode}, restarting it.")
+                workers[index] = start_worker(index)
+
+async def deliver_job_events():
+    """Relays progress and result messages from the workers to Telegram."""
+    while True:
+        try:
+            events = await asyncio.to_thread(JOB_QUEUE.take_events)
+        except Exception as e:
+            print(f"Error reading job events: {e}")
+            events = []
+        
+        for event in events:
+            job = json.loads(event['payload'])
+            reply_markup = None
+            if event['reply_markup']:
+                reply_markup = InlineKeyboardMarkup.de_json(json.loads(event['reply_markup']), None)
+            sent = queue_outbound(
+                job['chat_id'], job.get('message_id'), event['text'], reply_markup, bool(event['final'])
             )
-    else:
-        keyboard = [
-            [InlineKeyboardButton("🎨 Try Again", callback_data=CALLBACK_GENERATE)],
-            [InlineKeyboardButton("🏠 Main Menu", callback_data=CALLBACK_START)]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+            # Failures are already logged by the outbox
+            sent.add_done_callback(lambda future: future.exception())
         
-        await update.message.reply_text(
-            "❌ Failed to push to GitHub. Please check the logs.",
-            reply_markup=reply_markup
-        )
+        if not events:
+            await asyncio.sleep(0.2)
+
+async def warm_up(application: Application) -> None:
+    """Starts the outbox, then the repository or the worker processes, before updates are accepted."""
+    OUTBOX.start(application.bot)
+    
+    if PREVIEW_PORT and not PREVIEW_BASE_URL:
+        print("PREVIEW_PORT is set without PREVIEW_BASE_URL, so previews are disabled: users couldn't open the links.")
+    elif PREVIEW_PORT:
+        application.bot_data['preview_server'] = start_preview_server()
+    
+    if WORKER_PROCESSES > 0:
+        print(f"Starting {WORKER_PROCESSES} worker process(es)...")
+        workers = [start_worker(index) for index in range(WORKER_PROCESSES)]
+        application.bot_data['workers'] = workers
+        application.bot_data['background_tasks'] = [
+            asyncio.create_task(deliver_job_events()),
+            asyncio.create_task(supervise_workers(workers)),
+        ]
+    else:
+        application.bot_data['background_tasks'] = [await warm_up_repo()]
+
+async def shut_down(application: Application) -> None:
+    """Stops the background tasks and workers started in warm_up and flushes pending spans."""
+    for task in application.bot_data.get('background_tasks', []):
+        task.cancel()
+    for process in application.bot_data.get('workers', []):
+        process.terminate()
+    if application.bot_data.get('preview_server'):
+        application.bot_data['preview_server'].shutdown()
+    OUTBOX.stop()
+    
+    await asyncio.to_thread(TRACE_EXPORTER.close)
 
 # --- Main function to start the bot ---
 def main() -> None:
     """Starts the bot."""
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+    application = (
+        Application.builder()
+        .token(TELEGRAM_BOT_TOKEN)
+        .post_init(warm_up)
+        .post_shutdown(shut_down)
+        .concurrent_updates(PerChatUpdateProcessor(MAX_CONCURRENT_UPDATES))
+        .build()
+    )
 
     # Add command handlers
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("help", help_command))
+    application.add_handler(CommandHandler("redeploy", redeploy_command))
+    application.add_handler(CommandHandler("tweak", tweak_command))
+    application.add_handler(CommandHandler("status", status_command))
+    application.add_handler(CommandHandler("stats", stats_command))
     
     # Add callback query handler for buttons
     application.add_handler(CallbackQueryHandler(button_callback))
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Prints the slowest recent landing page jobs from the bot's trace file
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+from collections import defaultdict
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+# Must match JOB_SPAN_NAME in bot.py
+JOB_SPAN_NAME = "landing_page.job"
+
+def load_spans(trace_file):
+    """Reads spans from the trace file and its rotated backups."""
+    spans = []
+    for path in sorted(glob.glob(f"{trace_file}*")):
+        with open(path, "r", encoding="utf-8") as file:
+            for line in file:
+                try:
+                    spans.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+    return spans
+
+def slowest_jobs(spans, limit):
+    """Groups spans by trace and returns the slowest jobs with their spans."""
+    traces = defaultdict(list)
+    for span in spans:
+        traces[span["trace_id"]].append(span)
+
+    jobs = []
+    for trace_spans in traces.values():
+        roots = [span for span in trace_spans if span["name"] == JOB_SPAN_NAME]
+        if roots:
+            jobs.append((roots[0], trace_spans))
+
+    jobs.sort(key=lambda job: job[0]["duration_ms"], reverse=True)
+    return jobs[:limit]
+
+def print_job(root, trace_spans):
+    """Prints a job's total time and where it went, by span name."""
+    started = datetime.fromtimestamp(root["start"]).strftime("%Y-%m-%d %H:%M:%S")
+    attributes = root.get("attributes", {})
+    print(f"⏱️  {root['duration_ms'] / 1000:.1f}s  {started}  trace={root['trace_id']}")
+    print(f"   channel={attributes.get('channel_name')} page_type={attributes.get('page_type')} status={root['status']}")
+
+    totals = defaultdict(lambda: [0, 0.0, False])
+    for span in trace_spans:
+        if span is root:
+            continue
+        total = totals[span["name"]]
+        total[0] += 1
+        total[1] += span["duration_ms"]
+        total[2] = total[2] or span["status"] == "error"
+
+    for name, (count, duration_ms, failed) in sorted(totals.items(), key=lambda item: -item[1][1]):
+        marker = "❌" if failed else "  "
+        print(f"   {marker} {name:<36} x{count:<3} {duration_ms / 1000:7.2f}s")
+    print()
+
+def main():
+    """Prints the slowest recent jobs."""
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument("-n", "--limit", type=int, default=10, help="number of jobs to show")
+    parser.add_argument("-f", "--file", default=os.getenv("TRACE_FILE", "traces.jsonl"), help="trace file to read")
+    args = parser.parse_args()
+
+    spans = load_spans(args.file)
+    if not spans:
+        print(f"❌ No spans found in {args.file}")
+        return False
+
+    jobs = slowest_jobs(spans, args.limit)
+    print(f"🐢 Slowest {len(jobs)} job(s) from {args.file}\n")
+    for root, trace_spans in jobs:
+        print_job(root, trace_spans)
+
+    return True
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)